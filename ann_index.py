@@ -0,0 +1,321 @@
+import os
+import json
+import tempfile
+import threading
+
+import numpy as np
+
+try:
+    import hnswlib
+except ImportError:  # valfritt beroende, annars används IVF i ren NumPy
+    hnswlib = None
+
+from extraction_cache import CACHE_DIR
+
+# === Approximativ närmaste-granne-sökning över passage-embeddings ===
+# För stora samlingar (tiotusentals PDF:er) blir matris-vektor-produkten mot
+# alla passager för dyr per fråga. AnnIndex håller ett persistent index där
+# varje passage har en fast etikett (label) som aldrig återanvänds: nycklar
+# som försvunnit tas bort och nya läggs till, utan att allt byggs om.
+# Gamla IndexSnapshot-bilder kan därför fortsätta söka i samma index – okända
+# etiketter ignoreras och borttagna kommer inte längre tillbaka.
+#
+# Två backends:
+#   hnsw – hnswlib (om installerat). ef_search styr recall mot latens.
+#   ivf  – inverterad fil med k-means-centroider i NumPy. Vektorerna ligger i
+#          segmentfiler sorterade per lista och memory-mappas vid start; nya
+#          passager skrivs som nya segment och borttagna markeras tills
+#          segmenten slås ihop. nprobe styr recall mot latens.
+
+
+def _atomic_save(path, array):
+    directory = os.path.dirname(path) or "."
+    fd, tmp_path = tempfile.mkstemp(dir=directory, suffix=".tmp.npy")
+    os.close(fd)
+    np.save(tmp_path, array)
+    os.replace(tmp_path, path)
+
+
+class AnnIndex:
+    """Gemensam nyckel-/etiketthantering; backends implementerar _add,
+    _delete, _search, _save och _load."""
+
+    backend = None
+
+    def __init__(self, directory, dim, model_id):
+        self.directory = directory
+        self.dim = dim
+        self.model_id = model_id
+        self.labels = {}
+        self.next_label = 0
+        self._lock = threading.RLock()
+        os.makedirs(directory, exist_ok=True)
+        self.meta_path = os.path.join(directory, "ann_meta.json")
+        if not self._load_meta():
+            self._reset()
+
+    def _load_meta(self):
+        try:
+            with open(self.meta_path, encoding="utf-8") as f:
+                meta = json.load(f)
+        except (OSError, ValueError):
+            return False
+        if (meta.get("backend"), meta.get("dim"), meta.get("model")) != (self.backend, self.dim, self.model_id):
+            return False
+        try:
+            self._load(meta)
+        except (OSError, ValueError, RuntimeError):
+            return False
+        self.labels = meta["labels"]
+        self.next_label = meta["next_label"]
+        return True
+
+    def _save_meta(self, extra):
+        meta = {"backend": self.backend, "dim": self.dim, "model": self.model_id,
+                "next_label": self.next_label, "labels": self.labels, **extra}
+        tmp_path = self.meta_path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(meta, f)
+        os.replace(tmp_path, self.meta_path)
+
+    def __len__(self):
+        return len(self.labels)
+
+    def update(self, keys, matrix):
+        """Synkar indexet mot keys (en nyckel per rad i matrix) och returnerar
+        etiketterna i samma ordning."""
+        with self._lock:
+            wanted = set(keys)
+            removed = [label for key, label in self.labels.items() if key not in wanted]
+            for key in [key for key in self.labels if key not in wanted]:
+                del self.labels[key]
+
+            new_rows = [row for row, key in enumerate(keys) if key not in self.labels]
+            new_labels = np.arange(self.next_label, self.next_label + len(new_rows), dtype=np.int64)
+            for row, label in zip(new_rows, new_labels):
+                self.labels[keys[row]] = int(label)
+            self.next_label += len(new_rows)
+
+            if removed:
+                self._delete(np.asarray(removed, dtype=np.int64))
+            if new_rows:
+                self._add(new_labels, np.asarray(matrix[new_rows], dtype=np.float32))
+            if removed or new_rows:
+                self._save_meta(self._save())
+            return np.fromiter((self.labels[key] for key in keys), dtype=np.int64, count=len(keys))
+
+    def search(self, query, k):
+        """(etiketter, likheter) för de cirka k närmaste passagerna."""
+        with self._lock:
+            if not self.labels:
+                return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+            return self._search(np.asarray(query, dtype=np.float32), min(k, len(self.labels)))
+
+
+class HnswIndex(AnnIndex):
+    backend = "hnsw"
+
+    def __init__(self, directory, dim, model_id, ef_search=64, ef_construction=200, m=16):
+        self.ef_search = ef_search
+        self.ef_construction = ef_construction
+        self.m = m
+        self.index_path = os.path.join(directory, "hnsw.bin")
+        super().__init__(directory, dim, model_id)
+
+    def _new_index(self, capacity):
+        index = hnswlib.Index(space="ip", dim=self.dim)
+        index.init_index(max_elements=capacity, ef_construction=self.ef_construction, M=self.m)
+        return index
+
+    def _reset(self):
+        self.index = self._new_index(1024)
+        self.labels = {}
+        self.next_label = 0
+
+    def _load(self, meta):
+        self.index = hnswlib.Index(space="ip", dim=self.dim)
+        self.index.load_index(self.index_path, max_elements=meta["capacity"])
+
+    def _save(self):
+        self.index.save_index(self.index_path)
+        return {"capacity": self.index.get_max_elements()}
+
+    def _add(self, labels, vectors):
+        needed = self.index.get_current_count() + len(labels)
+        if needed > self.index.get_max_elements():
+            self.index.resize_index(max(needed, 2 * self.index.get_max_elements()))
+        self.index.add_items(vectors, labels)
+
+    def _delete(self, labels):
+        for label in labels:
+            self.index.mark_deleted(int(label))
+
+    def _search(self, query, k):
+        self.index.set_ef(max(self.ef_search, k))
+        labels, distances = self.index.knn_query(query, k=k)
+        # Avståndet för "ip" är 1 - skalärprodukt
+        return labels[0].astype(np.int64), (1.0 - distances[0]).astype(np.float32)
+
+
+class IvfIndex(AnnIndex):
+    backend = "ivf"
+
+    def __init__(self, directory, dim, model_id, nprobe=8, max_segments=8, train_sample=20000):
+        self.nprobe = nprobe
+        self.max_segments = max_segments
+        self.train_sample = train_sample
+        super().__init__(directory, dim, model_id)
+
+    def _reset(self):
+        self.centroids = np.zeros((1, self.dim), dtype=np.float32)
+        self.trained_size = 0
+        self.segments = []
+        self.deleted = np.empty(0, dtype=np.int64)
+        self.segment_counter = 0
+        self.labels = {}
+        self.next_label = 0
+
+    # --- Segment: vektorer sorterade per lista + offset per lista (CSR) ---
+
+    def _segment_paths(self, name):
+        base = os.path.join(self.directory, f"ivf_{name}")
+        return base + "_vectors.npy", base + "_labels.npy", base + "_offsets.npy"
+
+    def _write_segment(self, labels, vectors):
+        assign = self._assign(vectors)
+        order = np.argsort(assign, kind="stable")
+        offsets = np.searchsorted(assign[order], np.arange(len(self.centroids) + 1)).astype(np.int64)
+        name = f"{self.segment_counter:06d}"
+        self.segment_counter += 1
+        vectors_path, labels_path, offsets_path = self._segment_paths(name)
+        _atomic_save(vectors_path, vectors[order])
+        _atomic_save(labels_path, labels[order])
+        _atomic_save(offsets_path, offsets)
+        return self._open_segment(name)
+
+    def _open_segment(self, name):
+        vectors_path, labels_path, offsets_path = self._segment_paths(name)
+        return {
+            "name": name,
+            "vectors": np.load(vectors_path, mmap_mode="r"),
+            "labels": np.load(labels_path),
+            "offsets": np.load(offsets_path),
+        }
+
+    def _remove_segment_files(self, segment):
+        for path in self._segment_paths(segment["name"]):
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def _assign(self, vectors):
+        assign = np.empty(len(vectors), dtype=np.int32)
+        for start in range(0, len(vectors), 8192):
+            assign[start:start + 8192] = np.argmax(vectors[start:start + 8192] @ self.centroids.T, axis=1)
+        return assign
+
+    def _train(self, vectors, iterations=10):
+        # Sfärisk k-means (vektorerna är normaliserade) på ett urval
+        nlist = max(1, int(np.sqrt(len(vectors))))
+        rng = np.random.default_rng(0)
+        sample = vectors[rng.choice(len(vectors), min(len(vectors), self.train_sample), replace=False)]
+        centroids = sample[rng.choice(len(sample), nlist, replace=False)].copy()
+        for _ in range(iterations):
+            assign = np.argmax(sample @ centroids.T, axis=1)
+            for c in range(nlist):
+                members = sample[assign == c]
+                if len(members):
+                    centroids[c] = members.sum(axis=0)
+            centroids /= np.maximum(np.linalg.norm(centroids, axis=1, keepdims=True), 1e-9)
+        self.centroids = centroids.astype(np.float32)
+        self.trained_size = len(vectors)
+
+    def _all_alive(self):
+        labels, vectors = [], []
+        for segment in self.segments:
+            keep = ~np.isin(segment["labels"], self.deleted)
+            labels.append(segment["labels"][keep])
+            vectors.append(np.asarray(segment["vectors"][keep]))
+        if not labels:
+            return np.empty(0, dtype=np.int64), np.empty((0, self.dim), dtype=np.float32)
+        return np.concatenate(labels), np.concatenate(vectors)
+
+    def _compact(self, extra_labels=None, extra_vectors=None):
+        """Slår ihop alla segment (utan borttagna) och tränar om centroiderna."""
+        labels, vectors = self._all_alive()
+        if extra_labels is not None:
+            labels = np.concatenate([labels, extra_labels])
+            vectors = np.concatenate([vectors, extra_vectors])
+        old_segments = self.segments
+        self.deleted = np.empty(0, dtype=np.int64)
+        self.segments = []
+        if len(labels):
+            self._train(vectors)
+            self.segments = [self._write_segment(labels, vectors)]
+        for segment in old_segments:
+            self._remove_segment_files(segment)
+
+    def _add(self, labels, vectors):
+        alive = len(self.labels)
+        # Träna om när samlingen vuxit mycket sedan centroiderna beräknades
+        if alive > 4 * max(self.trained_size, 256) or len(self.segments) >= self.max_segments:
+            self._compact(labels, vectors)
+        else:
+            self.segments.append(self._write_segment(labels, vectors))
+
+    def _delete(self, labels):
+        self.deleted = np.union1d(self.deleted, labels)
+        stored = sum(len(segment["labels"]) for segment in self.segments)
+        if stored and len(self.deleted) > 0.3 * stored:
+            self._compact()
+
+    def _load(self, meta):
+        self.centroids = np.load(os.path.join(self.directory, "ivf_centroids.npy"))
+        self.deleted = np.load(os.path.join(self.directory, "ivf_deleted.npy"))
+        self.trained_size = meta["trained_size"]
+        self.segment_counter = meta["segment_counter"]
+        self.segments = [self._open_segment(name) for name in meta["segments"]]
+
+    def _save(self):
+        _atomic_save(os.path.join(self.directory, "ivf_centroids.npy"), self.centroids)
+        _atomic_save(os.path.join(self.directory, "ivf_deleted.npy"), self.deleted)
+        return {
+            "trained_size": self.trained_size,
+            "segment_counter": self.segment_counter,
+            "segments": [segment["name"] for segment in self.segments],
+        }
+
+    def _search(self, query, k):
+        probe = np.argsort(-(self.centroids @ query))[:self.nprobe]
+        labels, scores = [], []
+        for segment in self.segments:
+            offsets = segment["offsets"]
+            for lst in probe:
+                start, end = offsets[lst], offsets[lst + 1]
+                if end > start:
+                    labels.append(segment["labels"][start:end])
+                    scores.append(segment["vectors"][start:end] @ query)
+        if not labels:
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+        labels = np.concatenate(labels)
+        scores = np.concatenate(scores)
+        if len(self.deleted):
+            keep = ~np.isin(labels, self.deleted)
+            labels, scores = labels[keep], scores[keep]
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+            labels, scores = labels[top], scores[top]
+        order = np.argsort(-scores, kind="stable")
+        return labels[order], scores[order].astype(np.float32)
+
+
+def open_ann_index(model_id, dim, backend="auto", directory=None, **params):
+    """backend: "hnsw", "ivf" eller "auto" (hnsw om hnswlib finns)."""
+    if backend == "auto":
+        backend = "hnsw" if hnswlib is not None else "ivf"
+    if backend == "hnsw" and hnswlib is None:
+        raise ImportError("hnswlib saknas – installera det eller välj backend 'ivf'")
+    directory = directory or os.path.join(CACHE_DIR, f"ann_{backend}")
+    cls = HnswIndex if backend == "hnsw" else IvfIndex
+    return cls(directory, dim, model_id, **params)
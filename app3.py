@@ -2,10 +2,11 @@ import os
 import gradio as gr
 from docx import Document
 import fitz
-import base64
-import re
 import html  # <-- NYTT för att visa kod korrekt
-from io import BytesIO
+from extraction_cache import ExtractionCache
+from snippets import snippet_matcher
+from web_app import add_download_route, add_word_library_routes, download_url, launch, lazy_images_html, lazy_section_details
+from word_library import IMAGE_DIR, find_section, parse_word_sections
 
 # === Befintliga PDF/DOCX funktioner ===
 
@@ -23,42 +24,24 @@ def extract_text_from_docx(path):
     except Exception as e:
         return f"DOCX ERROR: {e}"
 
+extraction_cache = ExtractionCache()
+
 def load_documents(folder):
     docs = []
     for filename in os.listdir(folder):
         path = os.path.join(folder, filename)
         if filename.lower().endswith(".pdf"):
-            content = extract_text_from_pdf(path)
+            content = extraction_cache.get_or_extract(path, extract_text_from_pdf)
         elif filename.lower().endswith(".docx"):
-            content = extract_text_from_docx(path)
+            content = extraction_cache.get_or_extract(path, extract_text_from_docx)
         else:
             continue
         docs.append({"filename": filename, "content": content, "path": path})
+    extraction_cache.prune(folder, [d["path"] for d in docs])
     return docs
 
 documents = load_documents("docs")
 
-# === Helper: extract snippet ===
-
-def extract_context_snippet(text, query, max_chars=600):
-    text = text.replace("\n", " ")
-    match = re.search(re.escape(query), text, flags=re.IGNORECASE)
-    if not match:
-        return None
-
-    start = max(match.start() - max_chars // 2, 0)
-    end = min(match.end() + max_chars // 2, len(text))
-    snippet = text[start:end]
-
-    if start > 0:
-        snippet = "…" + snippet
-    if end < len(text):
-        snippet += "…"
-
-    def highlight(match):
-        return f"<mark>{match.group(0)}</mark>"
-    return re.sub(f"({re.escape(query)})", highlight, snippet, flags=re.IGNORECASE).strip()
-
 # === search_documents funktion ===
 
 def search_documents(query, visible_count=5):
@@ -85,18 +68,14 @@ def search_documents(query, visible_count=5):
 
     html_output = ""
     shown = 0
+    matcher = snippet_matcher(query)
     for doc, score, filename_match in results:
         if shown >= visible_count:
             break
 
-        highlighted_filename = re.sub(
-            f"({re.escape(query)})",
-            r"<mark>\1</mark>",
-            doc['filename'],
-            flags=re.IGNORECASE
-        )
+        highlighted_filename = matcher.highlight(doc['filename'])
 
-        snippet = extract_context_snippet(doc["content"], query)
+        snippet = matcher.snippet(doc["content"])
 
         if not snippet and filename_match:
             snippet = f"<div style='color:green'><b>Sökordet hittades i filnamnet.</b></div>"
@@ -108,52 +87,13 @@ def search_documents(query, visible_count=5):
             html_output += f"<p style='color:gray;'>⚠️ Ingen tydlig träfftext hittades.</p>"
 
         html_output += f"<p>🔍 <b>Matchningspoäng:</b> {round(score, 1)} "
-
-        try:
-            with open(doc["path"], "rb") as f:
-                b64 = base64.b64encode(f.read()).decode()
-                html_output += f"📥 <a href='data:application/octet-stream;base64,{b64}' download='{doc['filename']}'>Ladda ner filen</a></p><hr>"
-        except:
-            html_output += "❌ Gick inte att ladda filen</p><hr>"
+        html_output += f"📥 <a href='{download_url(doc['filename'])}' download='{html.escape(doc['filename'], quote=True)}'>Ladda ner filen</a></p><hr>"
 
         shown += 1
 
     show_more_visible = shown < len(results)
     return html_output if html_output else "❌ Inga träffar hittades.", gr.update(visible=show_more_visible)
 
-# === NY: Ladda och strukturera Word-dokument med rubrik + text + bilder ===
-
-def parse_word_sections(path):
-    from docx.opc.constants import RELATIONSHIP_TYPE as RT
-    doc = Document(path)
-    sections = []
-    current_section = {"heading": "", "text": "", "images": []}
-
-    for para in doc.paragraphs:
-        if para.style.name.startswith("Heading"):
-            if current_section["heading"]:
-                sections.append(current_section)
-            current_section = {"heading": para.text, "text": "", "images": []}
-        else:
-            current_section["text"] += para.text + "\n"
-
-        # Kolla om para har runs med bilder
-        for run in para.runs:
-            if run.element.xpath('.//a:blip'):
-                # Hämta relation id
-                blip = run.element.xpath('.//a:blip')[0]
-                rEmbed = blip.get('{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed')
-                image_part = doc.part.related_parts[rEmbed]
-                image_bytes = image_part.blob
-                img_b64 = base64.b64encode(image_bytes).decode()
-                current_section["images"].append(img_b64)
-
-    if current_section["heading"]:
-        sections.append(current_section)
-
-    return sections
-
-
 word_sections = parse_word_sections(os.path.join("quickSearch", "Bibliotek.docx"))
 
 # === NY: Sökfunktion för Word-dokument ===
@@ -182,37 +122,35 @@ def search_word_doc(query, visible_count=5):
 
     html_output = ""
     shown = 0
+    matcher = snippet_matcher(query)
     for section, score, heading_match in results:
         if shown >= visible_count:
             break
 
-        highlighted_heading = re.sub(
-            f"({re.escape(query)})",
-            r"<mark>\1</mark>",
-            section['heading'],
-            flags=re.IGNORECASE
-        )
+        highlighted_heading = matcher.highlight(section['heading'])
 
-        snippet = extract_context_snippet(section["text"], query)
+        snippet = matcher.snippet(section["text"])
         if not snippet and heading_match:
             snippet = f"<div style='color:green'><b>Sökordet hittades i rubriken.</b></div>"
 
-        # Bilder i base64
-        images_html = ""
-        for img_b64 in section['images']:
-            images_html += f"<img src='data:image/png;base64,{img_b64}' style='max-width:100%;'><br>"
-
-        # NYTT: Visa hela texten med <pre> för kodformat
-        escaped_text = html.escape(section['text'])
+        # Hela texten och bilderna hämtas först när "Läs mer" fälls ut
         html_output += f"<h4>📑 {highlighted_heading}</h4>"
         html_output += f"<div style='background-color:#f6f6f6;padding:10px;border-radius:5px;margin-bottom:5px;'>{snippet}</div>"
-        html_output += f"<details><summary>▶️ Läs mer</summary><pre style='white-space: pre-wrap;'>{escaped_text}</pre>{images_html}</details>"
+        html_output += lazy_section_details(section['id'])
         html_output += f"<p>🔍 <b>Matchningspoäng:</b> {round(score, 1)}</p><hr>"
 
         shown += 1
 
     return html_output if html_output else "❌ Inga träffar hittades."
 
+def render_section(section_id):
+    section = find_section(word_sections, section_id)
+    if section is None:
+        return None
+    # Visa hela texten med <pre> för kodformat
+    escaped_text = html.escape(section['text'])
+    return f"<pre style='white-space: pre-wrap;'>{escaped_text}</pre>" + lazy_images_html(section['images'])
+
 # === Gradio UI ===
 
 with gr.Blocks() as demo:
@@ -236,5 +174,12 @@ with gr.Blocks() as demo:
 
         query2.change(fn=search_word_doc, inputs=query2, outputs=output2)
 
+def find_document_path(filename):
+    return next((doc["path"] for doc in documents if doc["filename"] == filename), None)
+
+def setup_routes(app):
+    add_download_route(app, find_document_path)
+    add_word_library_routes(app, render_section, IMAGE_DIR)
+
 if __name__ == "__main__":
-    demo.launch()
+    launch(demo, setup_routes)
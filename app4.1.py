@@ -1,244 +1,201 @@
 import os
 import gradio as gr
-from docx import Document
-import fitz
-import base64
-import re
 import html
-from io import BytesIO
-from rapidfuzz import fuzz
-from pygments import highlight
-from pygments.lexers import PythonLexer
-from pygments.formatters import HtmlFormatter
-
-# === Befintliga PDF/DOCX funktioner ===
-
-def extract_text_from_pdf(path):
-    try:
-        with fitz.open(path) as doc:
-            return "\n".join(page.get_text() for page in doc)
-    except Exception as e:
-        return f"PDF ERROR: {e}"
-
-def extract_text_from_docx(path):
-    try:
-        doc = Document(path)
-        return "\n".join(p.text for p in doc.paragraphs)
-    except Exception as e:
-        return f"DOCX ERROR: {e}"
-
-def load_documents(folder):
-    docs = []
-    for filename in os.listdir(folder):
-        path = os.path.join(folder, filename)
-        if filename.lower().endswith(".pdf"):
-            content = extract_text_from_pdf(path)
-        elif filename.lower().endswith(".docx"):
-            content = extract_text_from_docx(path)
-        else:
-            continue
-        docs.append({"filename": filename, "content": content, "path": path})
-    return docs
-
-documents = load_documents("docs")
-
-# === Helper: extract snippet ===
-
-def extract_context_snippet(text, query, max_chars=600):
-    text = text.replace("\n", " ")
-    match = re.search(re.escape(query), text, flags=re.IGNORECASE)
-    if not match:
-        return None
-
-    start = max(match.start() - max_chars // 2, 0)
-    end = min(match.end() + max_chars // 2, len(text))
-    snippet = text[start:end]
-
-    if start > 0:
-        snippet = "…" + snippet
-    if end < len(text):
-        snippet += "…"
-
-    def highlight_match(match):
-        return f"<mark>{match.group(0)}</mark>"
-    return re.sub(f"({re.escape(query)})", highlight_match, snippet, flags=re.IGNORECASE).strip()
-
-# === search_documents funktion ===
-
-def search_documents(query, visible_count=5):
+from extraction import extract_pages_from_pdf, extract_text_from_docx, start_pool
+from extraction_cache import ExtractionCache
+from web_app import (
+    add_download_route, add_metrics_route, add_stats_route, add_word_library_routes, download_url, launch,
+    lazy_images_html, lazy_section_details,
+)
+from word_library import IMAGE_DIR, find_section, parse_word_sections
+from async_search import SUPERSEDED, SearchDebouncer, session_key
+from query_cache import QueryCache, normalize_query
+from pagination import ResultCursor
+from snippets import snippet_matcher
+from search_index import DocumentIndexer, IndexHolder, IndexSnapshot
+from search_engine import SOURCE_LABELS, SOURCES, SearchEngine
+from doc_watcher import DocWatcher
+from highlighting import STYLESHEET, highlight_text
+from metrics import QueryTrace, observe_payload, stage
+
+# === PDF/DOCX: extraheras parallellt via extraction.py och cachas på disk ===
+# PDF:er extraheras per sida (sidbrytning mellan sidorna) så att varje sida
+# blir en egen enhet i sökindexet.
+# Processpoolen startas innan webbserver och bevakning startar trådar och
+# återanvänds vid varje omindexering.
+start_pool()
+
+extraction_cache = ExtractionCache()
+document_indexer = DocumentIndexer(
+    "docs",
+    {".pdf": extract_pages_from_pdf, ".docx": extract_text_from_docx},
+    extraction_cache,
+)
+
+# === Gemensam sökning i docs/ och Bibliotek.docx (search_engine.py) ===
+# En fråga rankas en gång över alla källor; källfiltret och antalet träffar
+# per källa tillämpas på den cacheade rankningen.
+
+# Cacheade rankningar och färdigrenderade resultatsidor, nycklade på indexversion
+result_cache = QueryCache("rankning", maxsize=512)
+page_cache = QueryCache("resultatsidor", maxsize=256)
+section_cache = QueryCache("bibliotek_avsnitt", maxsize=512)
+
+SOURCE_CHOICES = [(label, source) for source, label in SOURCE_LABELS.items()]
+
+def search(query, sources=None):
     if not query or len(query.strip()) < 2:
-        return "❗️ Skriv minst 2 tecken för att söka.", gr.update(visible=False)
+        return "❗️ Skriv minst 2 tecken för att söka.", gr.update(visible=False), None
 
     query = query.strip()
-    results = []
-
-    for doc in documents:
-        score = 0
-        filename_match = fuzz.partial_ratio(query.lower(), doc['filename'].lower()) > 80
-        content_match = fuzz.partial_ratio(query.lower(), doc['content'].lower()) > 80
-
-        if filename_match:
-            score += 60
-        if content_match:
-            score += 10
-
-        if score > 0:
-            results.append((doc, score, filename_match))
-
-    results.sort(key=lambda x: (x[1], x[2]), reverse=True)
-
-    html_output = ""
-    shown = 0
-    for doc, score, filename_match in results:
-        if shown >= visible_count:
-            break
-
-        highlighted_filename = re.sub(
-            f"({re.escape(query)})",
-            r"<mark>\1</mark>",
-            doc['filename'],
-            flags=re.IGNORECASE
+    # Inget valt filter betyder alla källor
+    sources = tuple(source for source in SOURCES if not sources or source in sources)
+    with QueryTrace("sok", query):
+        snapshot = index.current
+        hits, facets = rank(snapshot, query)
+        units = snapshot.search_engine.units
+        cursor = ResultCursor(
+            index, snapshot, query, [hit for hit in hits if units[hit[0]].source in sources],
+            cache_key=(snapshot.version, normalize_query(query), sources),
         )
+        cursor.html = render_facets(facets, sources)
+        return show_next_page(cursor, snapshot)
+
+def show_more_results(cursor):
+    if cursor is None:
+        return gr.update(), gr.update(visible=False), None
+    with QueryTrace("visa_fler", cursor.query):
+        return show_next_page(cursor)
+
+def show_next_page(cursor, snapshot=None):
+    if cursor.next_page(render_page, page_cache, snapshot=snapshot) is None:
+        # Indexet har bytts sedan sökningen: träffarnas nycklar gäller inte längre
+        return cursor.html + "<p>🔄 Dokumenten har uppdaterats – sök igen för att se fler träffar.</p>", gr.update(visible=False), None
+    html_output = cursor.html if cursor.results else cursor.html + "❌ Inga träffar hittades."
+    return observe_payload(html_output, kind="sok"), gr.update(visible=cursor.has_more), cursor
+
+def rank(snapshot, query):
+    return result_cache.get_or_compute(
+        (snapshot.version, normalize_query(query)),
+        lambda: snapshot.search_engine.search(query),
+    )
+
+def render_facets(facets, sources):
+    parts = []
+    for source, label in SOURCE_LABELS.items():
+        part = f"{label}: {facets[source]}"
+        parts.append(f"<b>{part}</b>" if source in sources else f"<span style='color:gray;'>{part}</span>")
+    return f"<p>🔎 {' · '.join(parts)}</p>"
+
+def render_page(snapshot, query, results):
+    with stage("render"):
+        return _render_page(snapshot, query, results)
+
+def _render_page(snapshot, query, results):
+    html_output = ""
+    matcher = snippet_matcher(query, snapshot)
+    for unit_id, score, title_match in results:
+        unit = snapshot.search_engine.units[unit_id]
+        highlighted_title = matcher.highlight(unit.title)
 
-        snippet = extract_context_snippet(doc["content"], query)
+        with stage("snippet"):
+            snippet = matcher.snippet_for(unit)
 
-        if not snippet and filename_match:
-            snippet = f"<div style='color:green'><b>Sökordet hittades i filnamnet.</b></div>"
+        if not snippet and title_match:
+            where = "rubriken" if unit.source == "bibliotek" else "filnamnet"
+            snippet = f"<div style='color:green'><b>Sökordet hittades i {where}.</b></div>"
 
-        html_output += f"<h4>📄 {highlighted_filename}</h4>"
+        if unit.source == "bibliotek":
+            html_output += f"<h4>📑 {highlighted_title}</h4>"
+        else:
+            page = f" <small>(sida {unit.page + 1})</small>" if unit.page is not None else ""
+            html_output += f"<h4>{unit.item['icon']} {highlighted_title}{page}</h4>"
         if snippet:
             html_output += f"<div style='background-color:#f6f6f6;padding:10px;border-radius:5px;margin-bottom:5px;'>{snippet}</div>"
         else:
             html_output += f"<p style='color:gray;'>⚠️ Ingen tydlig träfftext hittades.</p>"
 
-        html_output += f"<p>🔍 <b>Matchningspoäng:</b> {round(score, 1)} "
-
-        try:
-            with open(doc["path"], "rb") as f:
-                b64 = base64.b64encode(f.read()).decode()
-                html_output += f"📥 <a href='data:application/octet-stream;base64,{b64}' download='{doc['filename']}'>Ladda ner filen</a></p><hr>"
-        except:
-            html_output += "❌ Gick inte att ladda filen</p><hr>"
-
-        shown += 1
-
-    show_more_visible = shown < len(results)
-    return html_output if html_output else "❌ Inga träffar hittades.", gr.update(visible=show_more_visible)
-
-# === NY: Ladda och strukturera Word-dokument med rubrik + text + bilder ===
-
-def parse_word_sections(path):
-    from docx.opc.constants import RELATIONSHIP_TYPE as RT
-    doc = Document(path)
-    sections = []
-    current_section = {"heading": "", "text": "", "images": []}
-
-    for para in doc.paragraphs:
-        if para.style.name.startswith("Heading"):
-            if current_section["heading"]:
-                sections.append(current_section)
-            current_section = {"heading": para.text, "text": "", "images": []}
+        if unit.source == "bibliotek":
+            html_output += lazy_section_details(unit.item['id'])
+            html_output += f"<p>🔍 <b>Matchningspoäng:</b> {round(score, 1)}</p><hr>"
         else:
-            current_section["text"] += para.text + "\n"
-
-        for run in para.runs:
-            if run.element.xpath('.//a:blip'):
-                blip = run.element.xpath('.//a:blip')[0]
-                rEmbed = blip.get('{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed')
-                image_part = doc.part.related_parts[rEmbed]
-                image_bytes = image_part.blob
-                img_b64 = base64.b64encode(image_bytes).decode()
-                current_section["images"].append(img_b64)
-
-    if current_section["heading"]:
-        sections.append(current_section)
-
-    return sections
-
-word_sections = parse_word_sections(os.path.join("quickSearch", "Bibliotek.docx"))
-
-# === NY: Sökfunktion för Word-dokument ===
-
-def search_word_doc(query, visible_count=5):
-    if not query or len(query.strip()) < 2:
-        return "❗️ Skriv minst 2 tecken för att söka."
+            filename = unit.item['filename']
+            html_output += f"<p>🔍 <b>Matchningspoäng:</b> {round(score, 1)} "
+            html_output += f"📥 <a href='{download_url(filename)}' download='{html.escape(filename, quote=True)}'>Ladda ner filen</a></p><hr>"
 
-    query = query.strip()
-    results = []
-
-    for section in word_sections:
-        query_words = query.lower().split()
-        score = 0
-
-        for word in query_words:
-            if fuzz.partial_ratio(word, section['heading'].lower()) > 80:
-                score += 100
+    return html_output
 
-        for word in query_words:
-            if fuzz.partial_ratio(word, section['text'].lower()) > 80:
-                score += 10
+WORD_LIBRARY = os.path.join("quickSearch", "Bibliotek.docx")
 
-        if score > 0:
-            results.append((section, score))
+# === Index: byggs vid start och byts atomärt när docs/ eller quickSearch/ ändras ===
 
-    results.sort(key=lambda x: x[1], reverse=True)
+def build_index(documents, word_sections):
+    engine = SearchEngine(documents, word_sections)
+    return IndexSnapshot(
+        documents=documents,
+        lexical_index=engine.content_index,
+        word_sections=word_sections,
+        search_engine=engine,
+    )
 
-    html_output = ""
-    shown = 0
-    formatter = HtmlFormatter(style="friendly", noclasses=True)
-
-    for section, score in results:
-        if shown >= visible_count:
-            break
-
-        highlighted_heading = re.sub(
-            f"({re.escape(query)})",
-            r"<mark>\1</mark>",
-            section['heading'],
-            flags=re.IGNORECASE
-        )
+index = IndexHolder(build_index(document_indexer.load(), parse_word_sections(WORD_LIBRARY)))
 
-        snippet = extract_context_snippet(section["text"], query)
-        if not snippet:
-            snippet = f"<div style='color:green'><b>Sökordet hittades i rubriken.</b></div>"
+def reindex(changed, removed):
+    documents = document_indexer.update(changed, removed)
+    word_sections = index.current.word_sections
+    if os.path.abspath(WORD_LIBRARY) in {os.path.abspath(p) for p in changed | removed}:
+        word_sections = parse_word_sections(WORD_LIBRARY) if os.path.exists(WORD_LIBRARY) else []
+    index.swap(build_index(documents, word_sections))
 
-        images_html = ""
-        for img_b64 in section['images']:
-            images_html += f"<img src='data:image/png;base64,{img_b64}' style='max-width:100%;'><br>"
+doc_watcher = DocWatcher(["docs", "quickSearch"], reindex)
 
-        highlighted_code = highlight(section['text'], PythonLexer(), formatter)
+# Avsnittets brödtext (med bilder) hämtas via URL när "Läs mer" fälls ut.
+# Avsnitts-id:t bygger på innehållet, så färgad HTML kan cachas per id.
+def render_section(section_id):
+    section = find_section(index.current.word_sections, section_id)
+    if section is None:
+        return None
+    return section_cache.get_or_compute(
+        section_id,
+        lambda: highlight_text(section['text']) + lazy_images_html(section['images']),
+    )
 
-        html_output += f"<h4>📑 {highlighted_heading}</h4>"
-        html_output += f"<div style='background-color:#f6f6f6;padding:10px;border-radius:5px;margin-bottom:5px;'>{snippet}</div>"
-        html_output += f"<details><summary>▶️ Läs mer</summary>{highlighted_code}{images_html}</details>"
-        html_output += f"<p>🔍 <b>Matchningspoäng:</b> {round(score, 1)}</p><hr>"
+# === Debounce: bara den senaste tangenttryckningen per session söker ===
 
-        shown += 1
+search_debouncer = SearchDebouncer()
 
-    return html_output if html_output else "❌ Inga träffar hittades."
+async def search_debounced(query, sources, request: gr.Request):
+    result = await search_debouncer.run(session_key(request, "sok"), search, query, sources)
+    return (gr.update(),) * 3 if result is SUPERSEDED else result
 
 # === Gradio UI ===
 
 with gr.Blocks() as demo:
     gr.Markdown("# 📚 NoWaste Dokumentbibliotek")
 
-    with gr.Tab("Sök i dokumentmapp"):
-        query1 = gr.Textbox(label="🔍 Sök i dokumentmapp", placeholder="Ex: inventering, pall, artikelnummer")
-        output1 = gr.HTML()
-        visible_count1 = gr.State(5)
-        show_more_btn1 = gr.Button("⬇️ Visa fler", visible=False)
-
-        def show_more_results(query, visible_count):
-            return search_documents(query, visible_count + 5) + (visible_count + 5,)
-
-        query1.change(fn=search_documents, inputs=[query1, visible_count1], outputs=[output1, show_more_btn1])
-        show_more_btn1.click(fn=show_more_results, inputs=[query1, visible_count1], outputs=[output1, show_more_btn1, visible_count1])
-
-    with gr.Tab("Sök i Bibliotek.docx"):
-        query2 = gr.Textbox(label="🔍 Sök i Bibliotek.docx", placeholder="Ex: lager, capabilities, brandfarligt")
-        output2 = gr.HTML()
-
-        query2.change(fn=search_word_doc, inputs=query2, outputs=output2)
+    query = gr.Textbox(label="🔍 Sök i dokumentmapp och Bibliotek.docx", placeholder="Ex: inventering, pall, lager, brandfarligt")
+    sources = gr.CheckboxGroup(SOURCE_CHOICES, value=list(SOURCES), label="Källor")
+    output = gr.HTML()
+    cursor = gr.State(None)
+    show_more_btn = gr.Button("⬇️ Visa fler", visible=False)
+
+    # concurrency_limit=None: hanteraren väntar mest, själva sökningen begränsas av trådpoolen
+    gr.on(
+        [query.change, sources.change], fn=search_debounced, inputs=[query, sources],
+        outputs=[output, show_more_btn, cursor],
+        trigger_mode="always_last", concurrency_limit=None, show_progress="hidden"
+    )
+    show_more_btn.click(fn=show_more_results, inputs=cursor, outputs=[output, show_more_btn, cursor])
+
+def find_document_path(filename):
+    return next((doc["path"] for doc in index.current.documents if doc["filename"] == filename), None)
+
+def setup_routes(app):
+    add_download_route(app, find_document_path)
+    add_word_library_routes(app, render_section, IMAGE_DIR, STYLESHEET)
+    add_stats_route(app)
+    add_metrics_route(app)
 
 if __name__ == "__main__":
-    demo.launch(server_name="0.0.0.0", server_port=int(os.environ.get("PORT", 7860)))
+    doc_watcher.start()
+    launch(demo, setup_routes, server_name="0.0.0.0", server_port=int(os.environ.get("PORT", 7860)))
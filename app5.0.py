@@ -3,6 +3,9 @@
 # - sentence-transformers import
 # - embeddings-kod
 # - semantic scoring
+# (indexet byggs som i version A och läses via index.current: indexbildens
+#  documents, lexical_index och sort_hits; filmetadata som
+#  mtime/icon/modified/size_mb finns redan på varje dokumentpost)
 
 # === ERSÄTT FUNKTION search_documents med: ===
 
@@ -13,11 +16,15 @@ def search_documents(query, visible_count=5, sort_by="poäng", search_history=[]
         return "❗️ Skriv minst 2 tecken för att söka.", gr.update(visible=False), search_history
 
     query = query.strip()
+    query_lower = query.lower()
+    snapshot = index.current
+    documents = snapshot.documents
+    content_hits, _ = snapshot.lexical_index.match(query)
     results = []
 
-    for doc in documents:
-        filename_match = fuzz.partial_ratio(query.lower(), doc['filename'].lower()) > 80
-        content_match = fuzz.partial_ratio(query.lower(), doc['content'].lower()) > 80
+    for doc_index, doc in enumerate(documents):
+        filename_match = fuzz.partial_ratio(query_lower, doc['filename_lower']) > 80
+        content_match = doc_index in content_hits
 
         score = 0
         if filename_match:
@@ -26,13 +33,12 @@ def search_documents(query, visible_count=5, sort_by="poäng", search_history=[]
             score += 10
 
         if score > 0:
-            results.append((doc, score, filename_match))
+            results.append((doc_index, score, filename_match))
 
-    # Sortering
-    if sort_by == "filnamn":
-        results.sort(key=lambda x: x[0]['filename'])
-    elif sort_by == "datum":
-        results.sort(key=lambda x: os.stat(x[0]['path']).st_mtime, reverse=True)
+    # Sortering: filnamn/datum är förberäknade ordningar i indexbilden
+    if sort_by in ("filnamn", "datum"):
+        by_index = {hit[0]: hit for hit in results}
+        results = [by_index[doc_index] for doc_index in snapshot.sort_hits(by_index, sort_by)]
     else:
         results.sort(key=lambda x: (x[1], x[2]), reverse=True)
 
@@ -48,30 +54,20 @@ def search_documents(query, visible_count=5, sort_by="poäng", search_history=[]
         search_history.pop(0)
 
     shown = 0
-    for doc, score, filename_match in results:
+    matcher = snippet_matcher(query, snapshot)
+    for doc_index, score, filename_match in results:
         if shown >= visible_count:
             break
 
-        ext = os.path.splitext(doc['filename'])[1].lower()
-        icon = "📕" if ext == ".pdf" else "📄"
+        doc = documents[doc_index]
+        highlighted_filename = matcher.highlight(doc['filename'])
 
-        stat = os.stat(doc['path'])
-        modified = datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d')
-        size_mb = round(stat.st_size / (1024*1024), 2)
-
-        highlighted_filename = re.sub(
-            f"({re.escape(query)})",
-            r"<mark>\1</mark>",
-            doc['filename'],
-            flags=re.IGNORECASE
-        )
-
-        snippet = extract_context_snippet(doc["content"], query)
+        snippet = matcher.snippet_for(doc)
         if not snippet and filename_match:
             snippet = f"<div style='color:green'><b>Sökordet hittades i filnamnet.</b></div>"
 
-        html_output += f"<h4>{icon} {highlighted_filename}</h4>"
-        html_output += f"<p>📅 Ändrad: {modified} | 💾 {size_mb} MB</p>"
+        html_output += f"<h4>{doc['icon']} {highlighted_filename}</h4>"
+        html_output += f"<p>📅 Ändrad: {doc['modified']} | 💾 {doc['size_mb']} MB</p>"
         if snippet:
             html_output += f"<div style='background-color:#f6f6f6;padding:10px;border-radius:5px;margin-bottom:5px;'>{snippet}</div>"
         else:
@@ -1,102 +1,318 @@
 import os
+import logging
 import gradio as gr
-from docx import Document
-import fitz
-import base64
-import re
 import html
-from io import BytesIO
 from rapidfuzz import fuzz
-from datetime import datetime
-from pygments import highlight
-from pygments.lexers import PythonLexer, SqlLexer, JsonLexer, TextLexer
-from pygments.formatters import HtmlFormatter
 import time
-from sentence_transformers import SentenceTransformer
-import numpy as np
-
-# === Ladda model för semantic search ===
-model = SentenceTransformer('paraphrase-MiniLM-L6-v2')
-
-# === PDF/DOCX extraction ===
-def extract_text_from_pdf(path):
-    with fitz.open(path) as doc:
-        return "\n".join(page.get_text() for page in doc)
-
-def extract_text_from_docx(path):
-    doc = Document(path)
-    return "\n".join(p.text for p in doc.paragraphs)
-
-def load_documents(folder):
-    docs = []
-    for filename in os.listdir(folder):
-        path = os.path.join(folder, filename)
-        if filename.lower().endswith(".pdf"):
-            content = extract_text_from_pdf(path)
-        elif filename.lower().endswith(".docx"):
-            content = extract_text_from_docx(path)
-        else:
-            continue
-        embedding = model.encode(content)
-        docs.append({"filename": filename, "content": content, "path": path, "embedding": embedding})
-    return docs
-
-documents = load_documents("docs")
-
-# === Helper: extract snippet ===
-def extract_context_snippet(text, query, max_chars=600):
-    text = text.replace("\n", " ")
-    match = re.search(re.escape(query), text, flags=re.IGNORECASE)
-    if not match:
-        return None
-    start = max(match.start() - max_chars // 2, 0)
-    end = min(match.end() + max_chars // 2, len(text))
-    snippet = text[start:end]
-    if start > 0:
-        snippet = "…" + snippet
-    if end < len(text):
-        snippet += "…"
-    def highlight_match(match):
-        return f"<mark>{match.group(0)}</mark>"
-    return re.sub(f"({re.escape(query)})", highlight_match, snippet, flags=re.IGNORECASE).strip()
-
-# === search_documents med semantic + rapidfuzz ===
-def search_documents(query, visible_count=5, sort_by="poäng", search_history=[]):
-    start_time = time.time()
+from extraction_cache import ExtractionCache
+from lexical_index import LexicalIndex
+from search_index import DocumentIndexer, IndexHolder, IndexSnapshot
+from doc_watcher import DocWatcher
+from ranking import reciprocal_rank_fusion, max_fusion_score
+from async_search import SUPERSEDED, SearchDebouncer, session_key
+from query_cache import QueryCache, normalize_query
+from pagination import ResultCursor
+from snippets import snippet_matcher
+from web_app import add_health_route, add_metrics_route, add_stats_route, launch
+from embedding_store import EmbeddingStore
+from embedding_backend import EmbeddingBackend, EncoderServer, MicroBatcher, RemoteEncoder
+from ann_index import hnswlib, open_ann_index
+from extraction import extract_pages_from_pdf, extract_sections_from_docx, start_pool
+from semantic_index import EmbeddingPipeline, SemanticIndex
+from warmup import Warmup
+from metrics import QueryTrace, observe_payload, stage, traced
+from shared_index import ENCODER_KEY, SERVE_ROLE, GenerationFollower, encoder_address, publish_latest
+
+logger = logging.getLogger(__name__)
+
+# === Model för semantic search (backend: NOGUIDE_EMBEDDING_BACKEND) ===
+# Laddas i bakgrunden av warmup (import av sentence_transformers drar in
+# torch); tills dess är model None och sökningen faller tillbaka på nyckelord.
+MODEL_NAME = 'paraphrase-MiniLM-L6-v2'
+model = None
+embedding_store = None
+query_batcher = None
+
+# ANN-index för stora samlingar. NOGUIDE_ANN: "auto" (från ANN_MIN_PASSAGES
+# passager, hnswlib om installerat annars IVF), "hnsw", "ivf" eller "av".
+# NOGUIDE_ANN_EF / NOGUIDE_ANN_NPROBE: högre ger bättre recall men långsammare sökning.
+ANN_MODE = os.environ.get("NOGUIDE_ANN", "auto")
+ANN_PARAMS = {
+    "hnsw": {"ef_search": int(os.environ.get("NOGUIDE_ANN_EF", 64))},
+    "ivf": {"nprobe": int(os.environ.get("NOGUIDE_ANN_NPROBE", 8))},
+}
+if ANN_MODE not in ("auto", "av", *ANN_PARAMS):
+    logger.error("Okänt värde NOGUIDE_ANN=%r (giltiga: auto, hnsw, ivf, av) – söker utan ANN-index", ANN_MODE)
+    ANN_MODE = "av"
+ANN_MIN_PASSAGES = 20000 if ANN_MODE == "auto" else 0
+ann = None
+
+def load_model():
+    global model, embedding_store, query_batcher, ann
+    if SERVE_ROLE == "worker":
+        # Modellen finns bara i indexeraren, som kodar frågorna åt alla arbetare (serve.py)
+        model = query_batcher = RemoteEncoder(encoder_address(), bytes.fromhex(ENCODER_KEY))
+        return
+    backend = EmbeddingBackend(MODEL_NAME)
+    embedding_store = EmbeddingStore(backend.model_id, name="passage_embeddings")
+    # Samtidiga sökningar kodar sina frågor i samma forward-anrop
+    query_batcher = MicroBatcher(backend.encode)
+    model = backend
+    if SERVE_ROLE == "indexer":
+        EncoderServer(backend, query_batcher, encoder_address(), bytes.fromhex(ENCODER_KEY)).start()
+    if ANN_MODE != "av":
+        # ANN är bara en accelerator: utan den jämförs frågan mot alla passager
+        ann_backend = ANN_MODE if ANN_MODE != "auto" else ("hnsw" if hnswlib is not None else "ivf")
+        try:
+            ann = open_ann_index(backend.model_id, backend.dimension, ann_backend, **ANN_PARAMS[ann_backend])
+        except Exception:
+            logger.exception("ANN-indexet (%s) kunde inte öppnas – söker utan ANN-index", ann_backend)
+            ann = None
+
+def encode_passages(texts, batch_size=64):
+    return model.encode(texts, batch_size=batch_size)
+
+# === PDF/DOCX extraction (en enhet per sida / rubrikavsnitt, separerade med PAGE_BREAK) ===
+# Processpoolen startas här, innan uppvärmning, webbserver och modell startar
+# trådar. Arbetaren extraherar ingenting och behöver ingen pool.
+if SERVE_ROLE != "worker":
+    start_pool()
+extraction_cache = ExtractionCache()
+document_indexer = DocumentIndexer(
+    "docs",
+    {".pdf": extract_pages_from_pdf, ".docx": extract_sections_from_docx},
+    extraction_cache,
+)
+
+# === Index: byggs i bakgrunden vid start och byts atomärt när docs/ ändras ===
+
+def build_index(documents):
+    return IndexSnapshot(
+        documents=documents,
+        # Filnamnet indexeras med innehållet så att BM25 även väger in titeln
+        lexical_index=LexicalIndex(d["filename"] + "\n" + d["content"] for d in documents),
+        # Bara nya/ändrade passager kodas om, resten läses från embedding_store
+        semantic_index=SemanticIndex(
+            documents, embedding_store, encode_passages, ann=ann, ann_min_passages=ANN_MIN_PASSAGES,
+        ) if model is not None else None,
+    )
 
-    if not query or len(query.strip()) < 2:
-        html_history = "<br>".join(search_history)
-        return "❗️ Skriv minst 2 tecken för att söka.", gr.update(visible=False), search_history, html_history
+# Tomt index tills uppvärmningen läst in dokumenten. Indexeraren publicerar
+# varje ny indexbild som en generation åt arbetarna (shared_index.py).
+index = IndexHolder(build_index([]), on_swap=publish_latest if SERVE_ROLE == "indexer" else None)
+
+def extract_and_embed(extract):
+    """extract(on_document) -> dokument. Är modellen laddad kodas passagerna i
+    batchar medan extract_many fortfarande lämnar text (EmbeddingPipeline),
+    så build_index bara behöver läsa dem från embedding_store."""
+    if model is None or embedding_store is None:
+        return extract(None)
+    pipeline = EmbeddingPipeline(embedding_store, encode_passages)
+    try:
+        return extract(pipeline.add)
+    finally:
+        pipeline.close()
+
+def reindex(changed, removed):
+    documents = extract_and_embed(lambda on_document: document_indexer.update(changed, removed, on_document))
+    index.swap(build_index(documents))
+
+doc_watcher = DocWatcher(["docs"], reindex)
+
+def load_documents():
+    # Nyckelordssökning fungerar så fort texten är extraherad. Vid uppstart är
+    # modellen inte laddad än, så passagerna kodas i steget "semantiskt index"
+    index.swap(build_index(extract_and_embed(document_indexer.load)))
+
+def load_semantic_index():
+    index.swap(build_index(document_indexer.documents()))
+
+if SERVE_ROLE == "worker":
+    # Arbetaren extraherar och kodar ingenting: den läser indexerarens generationer
+    generation_follower = GenerationFollower(index.swap)
+    warmup = Warmup([
+        ("dokument", generation_follower.attach),
+        ("modell", load_model),
+    ])
+else:
+    # Bevakningen startar sist så att den inte byter index mitt i uppvärmningen
+    warmup = Warmup([
+        ("dokument", load_documents),
+        ("modell", load_model),
+        ("semantiskt index", load_semantic_index),
+        ("bevakning", doc_watcher.start),
+    ])
+
+def health_status():
+    snapshot = index.current
+    status = warmup.status()
+    status.update(
+        role=SERVE_ROLE or None,
+        documents=len(snapshot.documents),
+        index_version=snapshot.version,
+        lexical=warmup.step_done("dokument"),
+        semantic=snapshot.semantic_index is not None,
+        embedding_backend=model.backend if model is not None else None,
+        ann=snapshot.semantic_index.ann.backend if snapshot.semantic_index is not None and snapshot.semantic_index.ann is not None else None,
+    )
+    return status
+SEMANTIC_TOP_K = 50
+
+def describe_unit(doc, unit_index):
+    if doc['filename'].lower().endswith(".pdf"):
+        return f"sida {unit_index + 1}"
+    heading = doc.unit_text(unit_index).strip().split("\n")[0]
+    return f"avsnitt \"{html.escape(heading[:80])}\""
+
+# === search_documents: BM25, semantisk eller hybrid (reciprocal rank fusion) ===
+# Resultaten strömmas: nyckelordsträffar visas direkt medan frågan kodas och
+# den semantiska/hybrida rankningen beräknas.
+
+# Cacheade query-embeddings, rankningar och renderade sidor. Rankningar och
+# sidor nycklas på indexversionen och blir inaktuella vid omindexering.
+SEARCH_MODES = ("hybrid", "semantisk", "nyckelord")
+SORT_ORDERS = ("poäng", "filnamn", "datum")
+KEYWORD_NOTICE = "<p>⏳ Semantisk sökning startar – visar nyckelordsträffar så länge.</p>"
+STALE_NOTICE = "<p>🔄 Dokumenten har uppdaterats – sök igen för att se fler träffar.</p>"
+
+embedding_cache = QueryCache("query_embeddings", maxsize=1024)
+result_cache = QueryCache("dokument_rankning", maxsize=512)
+page_cache = QueryCache("dokument_sidor", maxsize=256)
+
+class EncoderUnavailable(Exception):
+    """Frågan kunde inte kodas (indexeraren är nere, startas om eller svarar inte)."""
+
+def encode_query(query):
+    with stage("encode"):
+        try:
+            return _encode_query(query)
+        except TimeoutError as e:
+            raise EncoderUnavailable(str(e)) from e
+        except (OSError, EOFError):
+            # Anslutningen kan vara från före en omstart av indexeraren: ett nytt försök
+            try:
+                return _encode_query(query)
+            except (OSError, EOFError) as e:
+                raise EncoderUnavailable(str(e)) from e
+
+def _encode_query(query):
+    return embedding_cache.get_or_compute(
+        (model.model_id, normalize_query(query)),
+        lambda: query_batcher.encode(query),
+    )
 
-    query = query.strip()
-    query_embedding = model.encode(query)
-    results = []
+def rank_documents(snapshot, query, mode):
+    return result_cache.get_or_compute(
+        (snapshot.version, normalize_query(query), mode),
+        lambda: _rank_documents(snapshot, query, mode),
+    )
 
-    for doc in documents:
-        filename_match = fuzz.partial_ratio(query.lower(), doc['filename'].lower()) > 80
-        rapid_score = 60 if filename_match else 0
-        rapid_score += 10 if fuzz.partial_ratio(query.lower(), doc['content'].lower()) > 80 else 0
+def _rank_documents(snapshot, query, mode):
+    query_lower = query.lower()
+    documents = snapshot.documents
 
-        semantic_score = np.dot(query_embedding, doc['embedding']) / (np.linalg.norm(query_embedding) * np.linalg.norm(doc['embedding'])) * 100
+    query_embedding = encode_query(query) if mode != "nyckelord" else None
 
-        score = semantic_score * 0.8 + rapid_score * 0.2
+    with stage("candidates"):
+        lexical_scores = {} if mode == "semantisk" else snapshot.lexical_index.bm25(query)
+        lexical_ranking = sorted(lexical_scores, key=lexical_scores.get, reverse=True)
 
-        if score > 0:
-            results.append((doc, score, filename_match))
+        semantic_hits = {}
+        if query_embedding is not None:
+            for doc_index, similarity, passage in snapshot.semantic_index.search(query_embedding, top_k=SEMANTIC_TOP_K):
+                semantic_hits[doc_index] = (similarity, passage)
 
-    # Sortering
-    if sort_by == "filnamn":
-        results.sort(key=lambda x: x[0]['filename'])
-    elif sort_by == "datum":
-        results.sort(key=lambda x: os.stat(x[0]['path']).st_mtime, reverse=True)
-    else:
+    with stage("scoring"):
+        if mode == "hybrid":
+            fused = reciprocal_rank_fusion([lexical_ranking, list(semantic_hits)])
+            scores = {doc_index: fused_score / max_fusion_score(2) * 100 for doc_index, fused_score in fused.items()}
+        elif mode == "semantisk":
+            scores = {doc_index: similarity * 100 for doc_index, (similarity, _) in semantic_hits.items()}
+        else:
+            scores = lexical_scores
+
+        results = []
+        for doc_index, score in scores.items():
+            if score <= 0:
+                continue
+            filename_match = fuzz.partial_ratio(query_lower, documents[doc_index]['filename_lower']) > 80
+            passage = semantic_hits[doc_index][1] if doc_index in semantic_hits else None
+            # Bara index och poäng: markören i sessionen ska inte hålla dokumentposterna
+            results.append((doc_index, score, filename_match, passage))
+
+    with stage("sort"):
         results.sort(key=lambda x: (x[1], x[2]), reverse=True)
+    return results
+
+def search_documents(query, sort_by="poäng", search_history=[], mode="hybrid"):
+    """Generator: lämnar (html, visa-fler, historik, historik-html, markör)
+    flera gånger – först nyckelordsträffar, sedan den slutliga rankningen."""
+    # Värdena kommer från klienten (API:t tar emot vad som helst, t.ex. listor)
+    # och ingår i cachenycklar och mätvärdenas etiketter
+    if mode not in SEARCH_MODES:
+        mode = "hybrid"
+    if sort_by not in SORT_ORDERS:
+        sort_by = "poäng"
+    trace = QueryTrace("dokument", query)
+    return traced(trace, _search_documents(trace, query, sort_by, search_history, mode))
+
+def _search_documents(trace, query, sort_by, search_history, mode):
+    start_time = time.time()
 
-    num_hits = len(results)
-    num_docs = len(documents)
-    elapsed = round(time.time() - start_time, 2)
+    if not query or len(query.strip()) < 2:
+        trace.labels["mode"] = mode
+        html_history = "<br>".join(search_history)
+        yield "❗️ Skriv minst 2 tecken för att söka.", gr.update(visible=False), search_history, html_history, None
+        return
 
-    html_output = f"<p>🔎 {num_hits} träffar i {num_docs} genomsökta dokument. ⏱️ {elapsed} sekunder.</p>"
+    query = query.strip()
+    snapshot = index.current
+    # Under uppvärmningen finns bara det lexikala indexet
+    notice = ""
+    if not warmup.step_done("dokument"):
+        notice = "<p>⏳ Dokumenten läses in – sökresultaten är ännu inte kompletta.</p>"
+    if (snapshot.semantic_index is None or model is None) and mode != "nyckelord":
+        mode = "nyckelord"
+        notice = notice or KEYWORD_NOTICE
+    # Läget som faktiskt används (efter reserven till nyckelord)
+    trace.labels["mode"] = mode
+
+    # Frågan måste kodas innan semantisk/hybrid rankning finns: visa
+    # nyckelordsträffarna (billiga) under tiden, en träff i taget
+    previewed = False
+    if mode != "nyckelord" and (snapshot.version, normalize_query(query), mode) not in result_cache:
+        preview = ResultCursor(
+            index, snapshot, query, sorted_results(snapshot, query, "nyckelord", sort_by),
+            cache_key=(snapshot.version, normalize_query(query), "nyckelord", sort_by),
+        )
+        header = notice + "<p>⏳ Nyckelordsträffar – förfinar rankningen…</p>"
+        for _ in preview.iter_page(render_results, page_cache, snapshot=snapshot):
+            previewed = True
+            yield header + preview.html, gr.update(visible=False), gr.update(), gr.update(), None
+
+    try:
+        results = sorted_results(snapshot, query, mode, sort_by)
+    except EncoderUnavailable as e:
+        # Arbetare utan kontakt med indexeraren söker på nyckelord tills den är tillbaka
+        logger.warning("Frågan kunde inte kodas, söker på nyckelord: %s", e)
+        mode = "nyckelord"
+        notice = notice or KEYWORD_NOTICE
+        trace.labels["mode"] = mode
+        results = sorted_results(snapshot, query, mode, sort_by)
+    cursor = ResultCursor(
+        index, snapshot, query, results,
+        cache_key=(snapshot.version, normalize_query(query), mode, sort_by),
+    )
+
+    num_docs = len(snapshot.documents)
+    elapsed = round(time.time() - start_time, 2)
+    cursor.html = notice + f"<p>🔎 {len(cursor.results)} träffar i {num_docs} genomsökta dokument. ⏱️ {elapsed} sekunder.</p>"
+    for _ in cursor.iter_page(render_results, page_cache, snapshot=snapshot):
+        # Efter en förhandsvisning byts sidan ut i ett svep i stället för träff för träff
+        if not previewed:
+            yield cursor.html, gr.update(visible=False), gr.update(), gr.update(), cursor
+    if not cursor.results:
+        cursor.html += "❌ Inga träffar hittades."
 
     # Sökhistorik
     if query not in search_history:
@@ -105,48 +321,79 @@ def search_documents(query, visible_count=5, sort_by="poäng", search_history=[]
         search_history.pop(0)
     html_history = "<br>".join(search_history)
 
-    shown = 0
-    for doc, score, filename_match in results:
-        if shown >= visible_count:
-            break
-
-        ext = os.path.splitext(doc['filename'])[1].lower()
-        icon = "📕" if ext == ".pdf" else "📄"
-
-        stat = os.stat(doc['path'])
-        modified = datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d')
-        size_mb = round(stat.st_size / (1024*1024), 2)
-
-        highlighted_filename = re.sub(
-            f"({re.escape(query)})",
-            r"<mark>\1</mark>",
-            doc['filename'],
-            flags=re.IGNORECASE
-        )
-
-        snippet = extract_context_snippet(doc["content"], query)
+    yield observe_payload(cursor.html, kind="dokument"), gr.update(visible=cursor.has_more), search_history, html_history, cursor
+
+def show_more_results(cursor):
+    if cursor is None:
+        return gr.update(), gr.update(visible=False), None
+    with QueryTrace("visa_fler", cursor.query):
+        if cursor.next_page(render_results, page_cache) is None:
+            return cursor.html + STALE_NOTICE, gr.update(visible=False), None
+    return observe_payload(cursor.html, kind="dokument"), gr.update(visible=cursor.has_more), cursor
+
+def sorted_results(snapshot, query, mode, sort_by):
+    results = rank_documents(snapshot, query, mode)
+    # Sortering via förberäknade ordningar (den cachade rankningen ändras inte)
+    if sort_by in ("filnamn", "datum"):
+        with stage("sort"):
+            by_index = {result[0]: result for result in results}
+            results = [by_index[doc_index] for doc_index in snapshot.sort_hits(by_index, sort_by)]
+    return results
+
+def render_results(snapshot, query, results):
+    # "render" innefattar "snippet" (tiden för själva utdragen)
+    with stage("render"):
+        return _render_results(snapshot, query, results)
+
+def _render_results(snapshot, query, results):
+    semantic_index = snapshot.semantic_index
+    html_output = ""
+    matcher = snippet_matcher(query, snapshot)
+    for doc_index, score, filename_match, passage in results:
+        doc = snapshot.documents[doc_index]
+        highlighted_filename = matcher.highlight(doc['filename'])
+
+        with stage("snippet"):
+            snippet = matcher.snippet_for(doc)
+            if not snippet and passage is not None:
+                # Ingen exakt träff: visa den passage som matchade bäst semantiskt
+                best_passage = semantic_index.passage_text(passage)
+                snippet = html.escape(best_passage[:600]) + ("…" if len(best_passage) > 600 else "")
         if not snippet and filename_match:
             snippet = f"<div style='color:green'><b>Sökordet hittades i filnamnet.</b></div>"
 
-        html_output += f"<h4>{icon} {highlighted_filename}</h4>"
-        html_output += f"<p>📅 Ändrad: {modified} | 💾 {size_mb} MB</p>"
+        html_output += f"<h4>{doc['icon']} {highlighted_filename}</h4>"
+        if passage is not None:
+            unit = describe_unit(doc, int(semantic_index.chunk_unit[passage]))
+            html_output += f"<p>📅 Ändrad: {doc['modified']} | 💾 {doc['size_mb']} MB | 🎯 Bäst matchande: {unit}</p>"
+        else:
+            html_output += f"<p>📅 Ändrad: {doc['modified']} | 💾 {doc['size_mb']} MB</p>"
         if snippet:
             html_output += f"<div style='background-color:#f6f6f6;padding:10px;border-radius:5px;margin-bottom:5px;'>{snippet}</div>"
         else:
             html_output += f"<p style='color:gray;'>⚠️ Ingen tydlig träfftext hittades.</p>"
 
         html_output += f"<p>🔍 <b>Matchningspoäng:</b> {round(score, 1)}</p><hr>"
-        shown += 1
 
-    show_more_visible = shown < len(results)
-    return html_output if html_output else "❌ Inga träffar hittades.", gr.update(visible=show_more_visible), search_history, html_history
+    return html_output
+
+# === Debounce: bara den senaste tangenttryckningen per session söker ===
+search_debouncer = SearchDebouncer()
+
+async def search_documents_debounced(query, sort_by, search_history, mode, request: gr.Request):
+    # Strömmas: varje delresultat från search_documents visas direkt
+    async for result in search_debouncer.stream(
+        session_key(request, "dokument"), search_documents, query, sort_by, search_history, mode
+    ):
+        yield (gr.update(),) * 5 if result is SUPERSEDED else result
 
 # === Gradio UI ===
 with gr.Blocks() as demo:
     gr.Markdown("# 📚 NoWaste Dokumentbibliotek")
 
     dark_mode = gr.Checkbox(label="🌙 Dark mode", value=False)
-    sort_dropdown = gr.Dropdown(label="🔽 Sortera efter", choices=["poäng", "filnamn", "datum"], value="poäng")
+    sort_dropdown = gr.Dropdown(label="🔽 Sortera efter", choices=list(SORT_ORDERS), value="poäng")
+    mode_dropdown = gr.Dropdown(label="🧭 Sökläge", choices=list(SEARCH_MODES), value="hybrid")
     search_history_box = gr.HTML(label="🕑 Sökhistorik")
 
     def toggle_dark_mode(is_dark):
@@ -159,23 +406,32 @@ with gr.Blocks() as demo:
 
     query1 = gr.Textbox(label="🔍 Sök i dokument", placeholder="Ex: inventering, pall, artikelnummer")
     output1 = gr.HTML()
-    visible_count1 = gr.State(5)
+    cursor1 = gr.State(None)
     show_more_btn1 = gr.Button("⬇️ Visa fler", visible=False)
     search_history = gr.State([])
 
-    def show_more_results(query, visible_count, sort_by, search_history):
-        return search_documents(query, visible_count + 5, sort_by, search_history) + (visible_count + 5,)
-
+    # concurrency_limit=None: hanteraren väntar mest, själva sökningen begränsas av trådpoolen
     query1.change(
-        fn=search_documents, 
-        inputs=[query1, visible_count1, sort_dropdown, search_history], 
-        outputs=[output1, show_more_btn1, search_history, search_history_box]
+        fn=search_documents_debounced, 
+        inputs=[query1, sort_dropdown, search_history, mode_dropdown], 
+        outputs=[output1, show_more_btn1, search_history, search_history_box, cursor1],
+        trigger_mode="always_last", concurrency_limit=None, show_progress="hidden"
     )
     show_more_btn1.click(
         fn=show_more_results, 
-        inputs=[query1, visible_count1, sort_dropdown, search_history], 
-        outputs=[output1, show_more_btn1, visible_count1, search_history, search_history_box]
+        inputs=cursor1, 
+        outputs=[output1, show_more_btn1, cursor1]
     )
 
+def setup_routes(app):
+    add_stats_route(app)
+    add_metrics_route(app)
+    add_health_route(app, health_status)
+
 if __name__ == "__main__":
-    demo.launch()
+    warmup.start()
+    if SERVE_ROLE == "indexer":
+        # Ingen webbserver: indexeraren bygger, publicerar och kodar frågor tills den stoppas
+        while True:
+            time.sleep(3600)
+    launch(demo, setup_routes, server_port=int(os.environ.get("PORT", 7860)))
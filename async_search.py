@@ -0,0 +1,90 @@
+import asyncio
+import itertools
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import partial
+
+# === Debounce och avbrytning av sökningar per session ===
+# Varje tangenttryckning startar ett anrop, men anropet väntar först en kort
+# stund. Har användaren hunnit skriva mer under tiden är anropet inaktuellt
+# och returnerar SUPERSEDED utan att ha sökt. Själva sökningen körs i en
+# begränsad trådpool så att många samtidiga användare inte kan starta
+# obegränsat många parallella sökningar; ett resultat som hunnit bli
+# inaktuellt medan det beräknades kastas.
+#
+# stream() gör samma sak för en generator som lämnar delresultat (först
+# snabba nyckelordsträffar, sedan den förfinade rankningen): varje steg körs
+# i poolen och strömmen avbryts så fort en nyare sökning kommit in.
+
+SUPERSEDED = object()
+_END = object()
+
+
+class SearchDebouncer:
+    def __init__(self, delay=0.25, max_workers=4):
+        self.delay = delay
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="search")
+        self._counter = itertools.count()
+        self._latest = {}
+        self._lock = threading.Lock()
+
+    def _is_latest(self, key, seq):
+        with self._lock:
+            return self._latest.get(key) == seq
+
+    async def run(self, key, fn, *args):
+        """key identifierar sessionen (och sökrutan); fn(*args) körs i poolen."""
+        with self._lock:
+            seq = next(self._counter)
+            self._latest[key] = seq
+
+        await asyncio.sleep(self.delay)
+        if not self._is_latest(key, seq):
+            return SUPERSEDED
+
+        loop = asyncio.get_running_loop()
+        result = await loop.run_in_executor(self._executor, partial(fn, *args))
+
+        with self._lock:
+            if self._latest.get(key) != seq:
+                return SUPERSEDED
+            del self._latest[key]
+        return result
+
+    async def stream(self, key, fn, *args):
+        """Som run(), men fn(*args) är en generator; varje delresultat lämnas
+        vidare så länge sökningen är den senaste. Ger SUPERSEDED en gång om
+        den blivit inaktuell."""
+        with self._lock:
+            seq = next(self._counter)
+            self._latest[key] = seq
+
+        await asyncio.sleep(self.delay)
+        if not self._is_latest(key, seq):
+            yield SUPERSEDED
+            return
+
+        loop = asyncio.get_running_loop()
+        steps = fn(*args)
+        try:
+            while True:
+                result = await loop.run_in_executor(self._executor, next, steps, _END)
+                if result is _END:
+                    break
+                if not self._is_latest(key, seq):
+                    yield SUPERSEDED
+                    return
+                yield result
+        finally:
+            try:
+                steps.close()
+            except ValueError:
+                # Avbruten medan ett steg fortfarande körs i poolen
+                pass
+            with self._lock:
+                if self._latest.get(key) == seq:
+                    del self._latest[key]
+
+
+def session_key(request, name):
+    return (getattr(request, "session_hash", None), name)
@@ -0,0 +1,141 @@
+"""Jämför embedding-backends för den semantiska sökningen.
+
+Mäter laddningstid, kodning av passager, latens per fråga, genomströmning
+med samtidiga frågor (direkt respektive via MicroBatcher) och recall@k för
+passagerankningen jämfört med referensbackenden (den första i listan).
+
+    python bench/embedding_backends.py --backends torch onnx onnx-int8
+"""
+import os
+import sys
+import json
+import time
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from embedding_backend import BACKENDS, EmbeddingBackend, MicroBatcher
+from extraction import extract_pages_from_pdf, extract_sections_from_docx
+from extraction_cache import ExtractionCache
+from search_index import DocumentIndexer
+from semantic_index import document_passages
+
+MODEL_NAME = "paraphrase-MiniLM-L6-v2"
+
+QUERIES = [
+    "hur raderar jag en pall",
+    "inventering av lagerplats",
+    "skriva ut etiketter vid plock",
+    "pallar i buffertzonen",
+    "artikelnummer saknas",
+    "kortkommandon i ask",
+    "avbryta palluppdrag",
+    "brandfarligt gods adr",
+    "sätta transportör och sändningsnummer",
+    "saldo på plockplats",
+    "återrapportera order",
+    "skrivare för truck",
+]
+
+
+def load_passages(folder, max_passages):
+    indexer = DocumentIndexer(
+        folder,
+        {".pdf": extract_pages_from_pdf, ".docx": extract_sections_from_docx},
+        ExtractionCache(),
+    )
+    passages = [text for doc in indexer.load() for _, text, _, _ in document_passages(doc)]
+    return passages[:max_passages]
+
+
+def percentile(values, q):
+    return round(float(np.percentile(values, q)) * 1000, 2)
+
+
+def run_concurrent(encode_one, queries, threads):
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as pool:
+        list(pool.map(encode_one, queries))
+    return round(len(queries) / (time.perf_counter() - start), 1)
+
+
+def bench_backend(backend, passages, queries, threads, repeat, k):
+    start = time.perf_counter()
+    model = EmbeddingBackend(MODEL_NAME, backend)
+    load_s = time.perf_counter() - start
+
+    start = time.perf_counter()
+    passage_matrix = np.asarray(model.encode(passages))
+    passages_per_s = len(passages) / (time.perf_counter() - start)
+
+    model.encode(queries[:1])  # uppvärmning
+    latencies = []
+    query_vectors = []
+    for query in queries:
+        start = time.perf_counter()
+        query_vectors.append(np.asarray(model.encode([query]))[0])
+        latencies.append(time.perf_counter() - start)
+
+    load = queries * repeat
+    direct_qps = run_concurrent(lambda q: model.encode([q]), load, threads)
+    batcher = MicroBatcher(model.encode)
+    batched_qps = run_concurrent(batcher.encode, load, threads)
+
+    scores = np.stack(query_vectors) @ passage_matrix.T
+    top_k = np.argsort(-scores, axis=1)[:, :k]
+    return {
+        "backend": backend,
+        "load_s": round(load_s, 2),
+        "passages_per_s": round(passages_per_s, 1),
+        "query_p50_ms": percentile(latencies, 50),
+        "query_p95_ms": percentile(latencies, 95),
+        "direct_qps": direct_qps,
+        "batched_qps": batched_qps,
+        "mean_batch": round(batcher.items / max(batcher.batches, 1), 2),
+        "top_k": top_k.tolist(),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--backends", nargs="+", default=list(BACKENDS), choices=BACKENDS)
+    parser.add_argument("--docs", default="docs")
+    parser.add_argument("--max-passages", type=int, default=2000)
+    parser.add_argument("--threads", type=int, default=8)
+    parser.add_argument("--repeat", type=int, default=10, help="antal varv över frågorna i samtidighetstestet")
+    parser.add_argument("--k", type=int, default=10)
+    parser.add_argument("--json", help="skriv resultatet som JSON till den här filen")
+    args = parser.parse_args()
+
+    passages = load_passages(args.docs, args.max_passages)
+    print(f"{len(passages)} passager, {len(QUERIES)} frågor, {args.threads} trådar")
+
+    results = []
+    for backend in args.backends:
+        try:
+            results.append(bench_backend(backend, passages, QUERIES, args.threads, args.repeat, args.k))
+        except Exception as e:
+            # T.ex. saknad onnxruntime/optimum eller saknad kvantiserad export
+            print(f"{backend}: hoppas över ({e})")
+
+    if not results:
+        return
+    reference = results[0]["top_k"]
+    for result in results:
+        overlaps = [len(set(a) & set(b)) / len(b) for a, b in zip(result.pop("top_k"), reference)]
+        result[f"recall@{args.k}"] = round(float(np.mean(overlaps)), 3)
+
+    columns = list(results[0])
+    print(" | ".join(columns))
+    for result in results:
+        print(" | ".join(str(result[c]) for c in columns))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"reference": results[0]["backend"], "results": results}, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,315 @@
+"""Prestanda- och relevansmätning av sökapparna mot docs/.
+
+Varje app körs i en egen process så att kallstarten mäts från en ren import.
+Rapporterar indexeringstid vid start, latens per fråga (p50/p95/p99, med
+tömda cachar respektive cachat), minnesåtgång för documents/word_sections,
+recall@k och MRR mot frågorna i bench/queries.json samt storleken på den
+renderade HTML:en per fråga.
+
+    python bench/search_benchmark.py --json resultat.json
+    python bench/search_benchmark.py --apps app4.1.py --cold --compare gammalt.json
+
+app5.0.py är ett fragment (bygger på app5.1:s index) och kan inte köras
+fristående; den hoppas över med en notering.
+"""
+import os
+import sys
+import json
+import time
+import shutil
+import argparse
+import resource
+import tempfile
+import subprocess
+import importlib.util
+
+import numpy as np
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+DEFAULT_QUERIES = os.path.join(ROOT, "bench", "queries.json")
+RESULT_PREFIX = "BENCH_RESULT "
+
+
+# === Hjälpfunktioner ===
+
+def deep_sizeof(obj, seen=None):
+    """Ungefärlig minnesåtgång i byte för listor/dictar av strängar och tal.
+
+    För objekt med __slots__ räknas attributen; den memory-mappade korpusen
+    (attributet store) ligger i sidcachen och räknas inte."""
+    seen = set() if seen is None else seen
+    if id(obj) in seen:
+        return 0
+    seen.add(id(obj))
+    size = sys.getsizeof(obj)
+    if isinstance(obj, dict):
+        size += sum(deep_sizeof(k, seen) + deep_sizeof(v, seen) for k, v in obj.items())
+    elif isinstance(obj, (list, tuple, set, frozenset)):
+        size += sum(deep_sizeof(item, seen) for item in obj)
+    elif isinstance(obj, np.ndarray):
+        size += obj.nbytes if obj.base is None else 0
+    elif hasattr(type(obj), "__slots__"):
+        size += sum(deep_sizeof(getattr(obj, name, None), seen)
+                    for name in type(obj).__slots__ if name != "store")
+    return size
+
+
+def percentiles(values):
+    if not values:
+        return {}
+    return {f"p{q}_ms": round(float(np.percentile(values, q)) * 1000, 3) for q in (50, 95, 99)}
+
+
+def relevance(ranked, relevant, k):
+    relevant = set(relevant)
+    hits = [name for name in ranked[:k] if name in relevant]
+    rank = next((i + 1 for i, name in enumerate(ranked) if name in relevant), None)
+    return len(hits) / len(relevant), (1.0 / rank if rank else 0.0)
+
+
+def load_app(path):
+    spec = importlib.util.spec_from_file_location("bench_app", os.path.join(ROOT, path))
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    return module
+
+
+# === Adaptrar: samma mätning oavsett appens signaturer ===
+
+class App41:
+    modes = [None]
+
+    def __init__(self, module):
+        self.module = module
+
+    def warm_up(self):
+        pass
+
+    # En gemensam rankning (search_engine.py); dokument och Bibliotek är källfilter
+    def documents_ranking(self, query, mode):
+        units = self.module.index.current.search_engine.units
+        hits, _ = self.module.rank(self.module.index.current, query)
+        return [units[unit_id].title for unit_id, _, _ in hits if units[unit_id].source != "bibliotek"]
+
+    def search_html(self, query, mode):
+        return self.module.search(query, ["pdf", "docx"])[0]
+
+    def bibliotek_ranking(self, query):
+        units = self.module.index.current.search_engine.units
+        hits, _ = self.module.rank(self.module.index.current, query)
+        return [units[unit_id].title.strip() for unit_id, _, _ in hits if units[unit_id].source == "bibliotek"]
+
+    def bibliotek_html(self, query):
+        return self.module.search(query, ["bibliotek"])[0]
+
+
+class App51:
+    modes = ["hybrid", "semantisk", "nyckelord"]
+
+    def __init__(self, module):
+        self.module = module
+
+    def warm_up(self):
+        # Samma steg som bakgrundstråden, men synkront och utan filbevakning.
+        # Misslyckas modellsteget mäts appen som den då fungerar (nyckelord)
+        from warmup import FAILED
+        status = self.module.warmup.run(skip=("bevakning",))
+        for step in status["steps"]:
+            if step["status"] == FAILED:
+                print(f"uppvärmningssteget {step['name']} misslyckades: {step['error']}", file=sys.stderr)
+
+    def documents_ranking(self, query, mode):
+        snapshot = self.module.index.current
+        # Samma reserv som search_documents: utan modell rankas på nyckelord
+        if snapshot.semantic_index is None or self.module.model is None:
+            mode = "nyckelord"
+        results = self.module.rank_documents(snapshot, query, mode)
+        return [snapshot.documents[doc_index]["filename"] for doc_index, *_ in results]
+
+    def search_html(self, query, mode):
+        # search_documents strömmar delresultat; det sista är den färdiga sidan
+        *_, final = self.module.search_documents(query, "poäng", [], mode)
+        return final[0]
+
+    bibliotek_ranking = None
+    bibliotek_html = None
+
+
+ADAPTERS = {"app4.1.py": App41, "app5.1.py": App51}
+
+
+# === Körning av en app (i egen process) ===
+
+def run_worker(app_path, queries, k, repeat):
+    from query_cache import clear_all
+
+    started = time.perf_counter()
+    adapter = ADAPTERS[app_path](load_app(app_path))
+    import_s = time.perf_counter() - started
+    adapter.warm_up()
+    cold_start_s = time.perf_counter() - started
+
+    snapshot = adapter.module.index.current
+    result = {
+        "app": app_path,
+        "import_s": round(import_s, 3),
+        "cold_start_s": round(cold_start_s, 3),
+        "num_documents": len(snapshot.documents),
+        "memory": {
+            "documents_bytes": deep_sizeof(snapshot.documents),
+            "word_sections_bytes": deep_sizeof(snapshot.word_sections),
+            "max_rss_kb": resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+        },
+        "modes": {},
+    }
+
+    for mode in adapter.modes:
+        uncached, cached, payloads, recalls, rrs = [], [], [], [], []
+        per_query = []
+        for item in queries["documents"]:
+            query = item["query"]
+            for _ in range(repeat):
+                clear_all()
+                t = time.perf_counter()
+                html = adapter.search_html(query, mode)
+                uncached.append(time.perf_counter() - t)
+            t = time.perf_counter()
+            adapter.search_html(query, mode)
+            cached.append(time.perf_counter() - t)
+
+            recall, rr = relevance(adapter.documents_ranking(query, mode), item["relevant"], k)
+            payload = len(html.encode("utf-8"))
+            recalls.append(recall)
+            rrs.append(rr)
+            payloads.append(payload)
+            per_query.append({"query": query, "recall": round(recall, 3), "rr": round(rr, 3), "payload_bytes": payload})
+
+        result["modes"][mode or "standard"] = {
+            "latency_uncached": percentiles(uncached),
+            "latency_cached": percentiles(cached),
+            f"recall@{k}": round(float(np.mean(recalls)), 4),
+            "mrr": round(float(np.mean(rrs)), 4),
+            "payload_bytes_mean": int(np.mean(payloads)),
+            "payload_bytes_max": int(np.max(payloads)),
+            "queries": per_query,
+        }
+
+    if adapter.bibliotek_ranking is not None and queries.get("bibliotek"):
+        latencies, payloads, recalls, rrs = [], [], [], []
+        for item in queries["bibliotek"]:
+            clear_all()
+            t = time.perf_counter()
+            html = adapter.bibliotek_html(item["query"])
+            latencies.append(time.perf_counter() - t)
+            payloads.append(len(html.encode("utf-8")))
+            recall, rr = relevance(adapter.bibliotek_ranking(item["query"]), item["relevant"], k)
+            recalls.append(recall)
+            rrs.append(rr)
+        result["bibliotek"] = {
+            "latency_uncached": percentiles(latencies),
+            f"recall@{k}": round(float(np.mean(recalls)), 4),
+            "mrr": round(float(np.mean(rrs)), 4),
+            "payload_bytes_mean": int(np.mean(payloads)),
+        }
+    return result
+
+
+def run_app(app_path, args):
+    env = dict(os.environ)
+    cache_dir = None
+    if args.cold:
+        # Tom cachekatalog: all extraktion och kodning görs om
+        cache_dir = env["NOGUIDE_CACHE_DIR"] = tempfile.mkdtemp(prefix="noguide_bench_")
+    command = [sys.executable, os.path.abspath(__file__), "--worker", app_path,
+               "--queries", args.queries, "--k", str(args.k), "--repeat", str(args.repeat)]
+    try:
+        proc = subprocess.run(command, cwd=ROOT, env=env, capture_output=True, text=True)
+    finally:
+        if cache_dir is not None:
+            shutil.rmtree(cache_dir, ignore_errors=True)
+    for line in proc.stdout.splitlines():
+        if line.startswith(RESULT_PREFIX):
+            return json.loads(line[len(RESULT_PREFIX):])
+    return {"app": app_path, "error": (proc.stderr.strip().splitlines() or ["okänt fel"])[-1]}
+
+
+# === Rapport ===
+
+def summary_rows(results):
+    rows = []
+    for result in results:
+        if "error" in result:
+            rows.append((result["app"], "-", "fel: " + result["error"]))
+            continue
+        for mode, stats in result["modes"].items():
+            rows.append((result["app"], mode, stats))
+        if "bibliotek" in result:
+            rows.append((result["app"], "bibliotek", result["bibliotek"]))
+    return rows
+
+
+def print_report(results, k, previous=None):
+    previous_rows = {(app, mode): stats for app, mode, stats in summary_rows(previous or [])}
+    print(f"{'app':<10} {'läge':<10} {'p50':>8} {'p95':>8} {'p99':>8} {'recall@' + str(k):>9} {'mrr':>6} {'html':>8}")
+    for app, mode, stats in summary_rows(results):
+        if isinstance(stats, str):
+            print(f"{app:<10} {mode:<10} {stats}")
+            continue
+        latency = stats["latency_uncached"]
+        line = (f"{app:<10} {mode:<10} {latency['p50_ms']:>8} {latency['p95_ms']:>8} {latency['p99_ms']:>8} "
+                f"{stats[f'recall@{k}']:>9} {stats['mrr']:>6} {stats['payload_bytes_mean']:>8}")
+        old = previous_rows.get((app, mode))
+        if isinstance(old, dict):
+            line += (f"   (förut p50 {old['latency_uncached']['p50_ms']}, recall {old.get(f'recall@{k}')},"
+                     f" mrr {old['mrr']}, html {old['payload_bytes_mean']})")
+        print(line)
+    for result in results:
+        if "error" not in result:
+            memory = result["memory"]
+            print(f"{result['app']}: start {result['cold_start_s']} s (import {result['import_s']} s), "
+                  f"{result['num_documents']} dokument, documents {memory['documents_bytes'] // 1024} KiB, "
+                  f"word_sections {memory['word_sections_bytes'] // 1024} KiB, max RSS {memory['max_rss_kb'] // 1024} MiB")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--apps", nargs="+", default=["app4.1.py", "app5.0.py", "app5.1.py"])
+    parser.add_argument("--queries", default=DEFAULT_QUERIES)
+    parser.add_argument("--k", type=int, default=5)
+    parser.add_argument("--repeat", type=int, default=3, help="mätningar per fråga med tömda cachar")
+    parser.add_argument("--cold", action="store_true", help="kör med tom cachekatalog (ingen extraktions-/embeddingcache)")
+    parser.add_argument("--json", help="skriv resultatet som JSON till den här filen")
+    parser.add_argument("--compare", help="JSON från en tidigare körning att jämföra med")
+    parser.add_argument("--worker", help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    with open(args.queries, encoding="utf-8") as f:
+        queries = json.load(f)
+
+    if args.worker:
+        sys.path.insert(0, ROOT)
+        os.chdir(ROOT)
+        print(RESULT_PREFIX + json.dumps(run_worker(args.worker, queries, args.k, args.repeat)))
+        return
+
+    results = []
+    for app_path in args.apps:
+        if app_path not in ADAPTERS:
+            results.append({"app": app_path, "error": "kan inte köras fristående (fragment)"})
+            continue
+        results.append(run_app(app_path, args))
+
+    previous = None
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            previous = json.load(f)["results"]
+    print_report(results, args.k, previous)
+
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"k": args.k, "cold": args.cold, "created": time.strftime("%Y-%m-%dT%H:%M:%S"),
+                       "results": results}, f, indent=2, ensure_ascii=False)
+
+
+if __name__ == "__main__":
+    main()
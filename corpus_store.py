@@ -0,0 +1,215 @@
+import os
+import re
+import mmap
+import itertools
+
+import numpy as np
+
+from extraction import PAGE_BREAK
+
+# === Kompakt korpus på disk ===
+# All extraherad text skrivs efter varandra till en UTF-8-fil (.txt) med en
+# offsettabell (.offsets.npy), plus en normaliserad kopia (.norm: gemener,
+# radbrytningar/tabbar -> mellanslag) med exakt samma byteoffsets. Båda
+# memory-mappas, så texten ligger i sidcachen i stället för som Python-
+# strängar i varje process och delas mellan processer som öppnar samma
+# generation. Snippets söker direkt i .norm och avkodar bara fönstret de
+# visar från .txt.
+#
+# Dokumentens enheter (sidor/rubrikavsnitt, avgränsade av PAGE_BREAK) får
+# sina byteintervall när korpusen skrivs (.units.npy, med första enhet per
+# dokument i .doc_units.npy), så en enskild sida kan läsas utan att hela
+# dokumentet avkodas och delas om.
+#
+# Varje omindexering skriver en ny generation (ny filuppsättning); den gamla
+# tas bort från disk men förblir läsbar för index som fortfarande mappar den.
+
+NORMALIZE = str.maketrans("\n\r\f\t", "    ")
+GENERATION_RE = re.compile(r"\.(\d+)-(\d+)\.")
+PAGE_BREAK_BYTES = PAGE_BREAK.encode("utf-8")
+
+_generation = itertools.count()
+
+
+def normalize_text(text):
+    """Gemener och blanksteg utan att ändra någon teckens längd i UTF-8."""
+    lowered = text.lower()
+    if len(lowered) != len(text) or len(lowered.encode("utf-8")) != len(text.encode("utf-8")):
+        # Ett fåtal tecken byter längd vid gemenkonvertering: behåll dem som de är
+        lowered = "".join(
+            low if len(low) == 1 and len(low.encode("utf-8")) == len(char.encode("utf-8")) else char
+            for char, low in zip(text, map(str.lower, text))
+        )
+    return lowered.translate(NORMALIZE)
+
+
+def _map(path):
+    with open(path, "rb") as f:
+        if os.fstat(f.fileno()).st_size == 0:
+            return b""
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def _pid_alive(pid):
+    try:
+        os.kill(pid, 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        return True
+    return True
+
+
+def remove_stale_generations(directory, name):
+    """Tar bort generationer som lämnats kvar av processer som inte längre kör."""
+    try:
+        filenames = os.listdir(directory)
+    except OSError:
+        return
+    for filename in filenames:
+        match = GENERATION_RE.search(filename)
+        if filename.startswith(name + ".") and match and not _pid_alive(int(match.group(1))):
+            try:
+                os.remove(os.path.join(directory, filename))
+            except OSError:
+                pass
+
+
+class CorpusStore:
+    SUFFIXES = (".txt", ".norm", ".offsets.npy", ".units.npy", ".doc_units.npy")
+
+    def __init__(self, base):
+        self.base = base
+        self.offsets = np.load(base + ".offsets.npy")
+        self.units = np.load(base + ".units.npy")
+        self.doc_units = np.load(base + ".doc_units.npy")
+        self.text = _map(base + ".txt")
+        self.normalized = _map(base + ".norm")
+
+    def __len__(self):
+        return len(self.offsets) - 1
+
+    def span(self, doc_id):
+        return int(self.offsets[doc_id]), int(self.offsets[doc_id + 1])
+
+    def unit_spans(self, doc_id):
+        """(n, 2)-matris med byteintervallen för dokumentets enheter."""
+        return self.units[self.doc_units[doc_id]:self.doc_units[doc_id + 1]]
+
+    def text_of(self, doc_id):
+        start, end = self.span(doc_id)
+        return self.text[start:end].decode("utf-8")
+
+    def char_boundary(self, pos, lower):
+        # Flytta bakåt förbi UTF-8-fortsättningsbyte (10xxxxxx)
+        while pos > lower and (self.text[pos] & 0xC0) == 0x80:
+            pos -= 1
+        return pos
+
+    def decode(self, start, end):
+        return self.text[start:end].decode("utf-8", errors="replace")
+
+    def remove_files(self):
+        # Öppna mappningar fortsätter att fungera efter att filerna tagits bort
+        for suffix in self.SUFFIXES:
+            try:
+                os.remove(self.base + suffix)
+            except OSError:
+                pass
+
+
+class CorpusWriter:
+    def __init__(self, directory, name):
+        os.makedirs(directory, exist_ok=True)
+        self.base = os.path.join(directory, f"{name}.{os.getpid()}-{next(_generation)}")
+        self._text = open(self.base + ".txt", "wb")
+        self._normalized = open(self.base + ".norm", "wb")
+        self._offsets = [0]
+        self._units = []
+        self._doc_units = [0]
+
+    def _write(self, raw, normalized, units):
+        """units: enheternas byteintervall relativt raw."""
+        start = self._offsets[-1]
+        self._text.write(raw)
+        self._normalized.write(normalized)
+        self._offsets.append(start + len(raw))
+        self._units.extend((start + unit_start, start + unit_end) for unit_start, unit_end in units)
+        self._doc_units.append(len(self._units))
+        return len(self._offsets) - 2
+
+    @staticmethod
+    def _split_units(raw):
+        units, start = [], 0
+        while True:
+            end = raw.find(PAGE_BREAK_BYTES, start)
+            if end < 0:
+                units.append((start, len(raw)))
+                return units
+            units.append((start, end))
+            start = end + len(PAGE_BREAK_BYTES)
+
+    def add(self, text):
+        raw = text.encode("utf-8")
+        normalized = normalize_text(text).encode("utf-8")
+        if len(normalized) != len(raw):
+            normalized = raw.translate(bytes.maketrans(b"\n\r\f\t", b"    "))
+        return self._write(raw, normalized, self._split_units(raw))
+
+    def copy(self, store, doc_id):
+        """Kopierar ett oförändrat dokument från en tidigare generation utan att avkoda det."""
+        start, end = store.span(doc_id)
+        units = store.unit_spans(doc_id) - start
+        return self._write(store.text[start:end], store.normalized[start:end], units.tolist())
+
+    def close(self):
+        self._text.close()
+        self._normalized.close()
+        np.save(self.base + ".offsets.npy", np.asarray(self._offsets, dtype=np.int64))
+        np.save(self.base + ".units.npy", np.asarray(self._units, dtype=np.int64).reshape(-1, 2))
+        np.save(self.base + ".doc_units.npy", np.asarray(self._doc_units, dtype=np.int64))
+        return CorpusStore(self.base)
+
+
+class DocumentRecord:
+    """Metadata för ett dokument; texten läses från korpusen vid behov.
+
+    Stöder doc["fält"] så att befintlig kod som använder dictar fungerar.
+    Posten ändras aldrig: en ny generation får nya poster.
+    """
+
+    METADATA = ("filename", "filename_lower", "path", "ext", "icon", "mtime", "size", "modified", "size_mb")
+    __slots__ = METADATA + ("store", "doc_id", "_text")
+
+    def __init__(self, store=None, doc_id=None, text=None, **metadata):
+        for key in self.METADATA:
+            setattr(self, key, metadata[key])
+        self.store = store
+        self.doc_id = doc_id
+        self._text = text
+
+    @property
+    def content(self):
+        return self._text if self._text is not None else self.store.text_of(self.doc_id)
+
+    def span(self):
+        return self.store.span(self.doc_id)
+
+    def unit_text(self, unit_index):
+        """Texten för en enhet (sida/rubrikavsnitt); avkodar bara den enheten."""
+        if self._text is not None:
+            return self._text.split(PAGE_BREAK)[unit_index]
+        start, end = self.store.unit_spans(self.doc_id)[unit_index]
+        return self.store.decode(start, end)
+
+    def metadata(self):
+        return {key: getattr(self, key) for key in self.METADATA}
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+    def get(self, key, default=None):
+        return getattr(self, key, default)
@@ -0,0 +1,104 @@
+import os
+import logging
+import threading
+
+# === Bevakning av dokumentmappar ===
+# Pollar mapparna och rapporterar tillagda, ändrade och borttagna filer. En
+# fil rapporteras först när mtime/storlek varit oförändrade under en hel
+# period, så att halvkopierade filer inte indexeras. Om paketet watchdog
+# (inotify m.fl.) finns installerat väcks pollningen direkt vid händelser i
+# stället för att vänta ut intervallet.
+
+logger = logging.getLogger(__name__)
+
+WATCHED_EXTENSIONS = (".pdf", ".docx")
+
+
+def scan_folder(folder, extensions=WATCHED_EXTENSIONS):
+    signatures = {}
+    try:
+        entries = list(os.scandir(folder))
+    except FileNotFoundError:
+        return signatures
+    for entry in entries:
+        if entry.is_file() and entry.name.lower().endswith(extensions) and not entry.name.startswith("~$"):
+            stat = entry.stat()
+            signatures[entry.path] = (stat.st_mtime_ns, stat.st_size)
+    return signatures
+
+
+class DocWatcher(threading.Thread):
+    def __init__(self, folders, on_change, interval=5.0, extensions=WATCHED_EXTENSIONS):
+        super().__init__(name="DocWatcher", daemon=True)
+        self.folders = list(folders)
+        self.on_change = on_change
+        self.interval = interval
+        self.extensions = extensions
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._observer = None
+
+    def scan(self):
+        signatures = {}
+        for folder in self.folders:
+            signatures.update(scan_folder(folder, self.extensions))
+        return signatures
+
+    def _start_observer(self):
+        try:
+            from watchdog.observers import Observer
+            from watchdog.events import FileSystemEventHandler
+        except ImportError:
+            return
+
+        wake = self._wake
+
+        class WakeHandler(FileSystemEventHandler):
+            def on_any_event(self, event):
+                wake.set()
+
+        observer = Observer()
+        for folder in self.folders:
+            if os.path.isdir(folder):
+                observer.schedule(WakeHandler(), folder, recursive=False)
+        observer.daemon = True
+        observer.start()
+        self._observer = observer
+
+    def stop(self):
+        self._stopped.set()
+        self._wake.set()
+        if self._observer is not None:
+            self._observer.stop()
+
+    def run(self):
+        self._start_observer()
+        known = self.scan()
+        pending = {}
+
+        while not self._stopped.is_set():
+            # Väckt av watchdog: vänta ändå ett intervall så att filen hinner bli klar
+            if self._wake.wait(self.interval):
+                self._wake.clear()
+                self._stopped.wait(min(self.interval, 1.0))
+            if self._stopped.is_set():
+                break
+
+            current = self.scan()
+            stable = {path: sig for path, sig in current.items() if pending.get(path) == sig}
+            pending = {path: sig for path, sig in current.items() if known.get(path) != sig}
+
+            changed = {path for path, sig in stable.items() if known.get(path) != sig}
+            removed = set(known) - set(current)
+            if not changed and not removed:
+                continue
+
+            try:
+                self.on_change(changed, removed)
+            except Exception:
+                logger.exception("Omindexering misslyckades")
+                continue
+            for path in changed:
+                known[path] = current[path]
+            for path in removed:
+                known.pop(path, None)
@@ -0,0 +1,243 @@
+import os
+import time
+import queue
+import threading
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Listener
+
+import numpy as np
+
+# === Backend för den semantiska modellen ===
+# "torch" är SentenceTransformers vanliga PyTorch-modell. "onnx" kör samma
+# vikter i ONNX Runtime och "onnx-int8" en int8-kvantiserad ONNX-export, båda
+# betydligt snabbare på CPU (kräver sentence-transformers[onnx]). Backend
+# väljs med NOGUIDE_EMBEDDING_BACKEND.
+#
+# Frågor kodas via MicroBatcher: samtidiga sökningar samlas ihop till ett
+# enda forward-anrop i stället för ett per förfrågan.
+#
+# Med flera sökprocesser (serve.py) laddas modellen bara i indexeraren:
+# EncoderServer tar emot frågor från arbetarnas RemoteEncoder och kodar dem
+# via samma MicroBatcher, så frågor från alla processer delar batchar. Är
+# indexeraren nere eller svarar inte inom NOGUIDE_ENCODE_TIMEOUT_S söker
+# arbetaren på nyckelord.
+
+EMBEDDING_BACKEND = os.environ.get("NOGUIDE_EMBEDDING_BACKEND", "torch")
+BACKENDS = ("torch", "onnx", "onnx-int8")
+
+# Kvantiserade exporter som följer med sentence-transformers modeller på Hugging Face
+ONNX_INT8_FILE = os.environ.get("NOGUIDE_ONNX_INT8_FILE", "onnx/model_quint8_avx2.onnx")
+
+# Längsta väntan på indexeraren per fråga innan arbetaren söker på nyckelord
+ENCODE_TIMEOUT = float(os.environ.get("NOGUIDE_ENCODE_TIMEOUT_S", 5))
+# Väntan (min, max sekunder) efter ett fel i EncoderServers accept()
+ACCEPT_BACKOFF = (0.05, 2.0)
+
+
+class EmbeddingBackend:
+    def __init__(self, model_name, backend=EMBEDDING_BACKEND):
+        if backend not in BACKENDS:
+            raise ValueError(f"Okänd embedding-backend: {backend} (välj bland {', '.join(BACKENDS)})")
+        from sentence_transformers import SentenceTransformer
+
+        self.model_name = model_name
+        self.backend = backend
+        if backend == "torch":
+            self.model = SentenceTransformer(model_name)
+        elif backend == "onnx":
+            self.model = SentenceTransformer(model_name, backend="onnx")
+        else:
+            self.model = SentenceTransformer(model_name, backend="onnx", model_kwargs={"file_name": ONNX_INT8_FILE})
+
+    @property
+    def model_id(self):
+        # ONNX i fp32 ger samma vektorer som PyTorch och kan dela lagrade
+        # embeddings; den kvantiserade modellen får egna
+        return self.model_name + ("+int8" if self.backend == "onnx-int8" else "")
+
+    @property
+    def dimension(self):
+        return self.model.get_sentence_embedding_dimension()
+
+    def encode(self, texts, batch_size=64):
+        return self.model.encode(texts, batch_size=batch_size, normalize_embeddings=True)
+
+
+class MicroBatcher:
+    """Samlar samtidiga anrop till encode(text) och kodar dem i en batch.
+
+    Den första texten i en batch väntar högst max_wait sekunder på sällskap.
+    """
+
+    def __init__(self, encode_batch, max_batch=32, max_wait=0.005):
+        self.encode_batch = encode_batch
+        self.max_batch = max_batch
+        self.max_wait = max_wait
+        self.batches = 0
+        self.items = 0
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="MicroBatcher", daemon=True)
+        self._thread.start()
+
+    def encode(self, text):
+        future = Future()
+        self._queue.put((text, future))
+        return future.result()
+
+    def _collect(self):
+        batch = [self._queue.get()]
+        deadline = time.monotonic() + self.max_wait
+        while len(batch) < self.max_batch:
+            remaining = deadline - time.monotonic()
+            try:
+                batch.append(self._queue.get(timeout=remaining) if remaining > 0 else self._queue.get_nowait())
+            except queue.Empty:
+                break
+        return batch
+
+    def _run(self):
+        while True:
+            batch = self._collect()
+            texts = [text for text, _ in batch]
+            try:
+                vectors = np.asarray(self.encode_batch(texts))
+            except Exception as e:
+                for _, future in batch:
+                    future.set_exception(e)
+                continue
+            self.batches += 1
+            self.items += len(batch)
+            for (_, future), vector in zip(batch, vectors):
+                future.set_result(vector)
+
+
+def _require_authkey(authkey):
+    # Frågor och svar avserialiseras med pickle: utan nyckel kan vilken lokal
+    # process som helst som når porten köra kod i den andra processen
+    if not authkey:
+        raise ValueError("NOGUIDE_ENCODER_KEY saknas: frågekodning mellan processer kräver en nyckel")
+
+
+class EncoderServer:
+    """Kodar frågor åt andra processer (multiprocessing.connection, autentiserad med authkey)."""
+
+    def __init__(self, backend, batcher, address, authkey):
+        _require_authkey(authkey)
+        self.backend = backend
+        self.batcher = batcher
+        self._listener = Listener(address, authkey=authkey)
+        self._thread = threading.Thread(target=self._accept, name="EncoderServer", daemon=True)
+
+    def start(self):
+        self._thread.start()
+        return self
+
+    def _accept(self):
+        delay = ACCEPT_BACKOFF[0]
+        while True:
+            try:
+                conn = self._listener.accept()
+            except Exception:
+                # Fel nyckel, avbruten anslutning eller fel i lyssnaren: vänta
+                # allt längre i stället för att snurra om felet upprepas
+                time.sleep(delay)
+                delay = min(delay * 2, ACCEPT_BACKOFF[1])
+                continue
+            delay = ACCEPT_BACKOFF[0]
+            threading.Thread(target=self._serve, args=(conn,), name="EncoderConnection", daemon=True).start()
+
+    def _serve(self, conn):
+        with conn:
+            conn.send((self.backend.model_id, self.backend.backend))
+            while True:
+                try:
+                    text = conn.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    conn.send(self.batcher.encode(text))
+                except Exception as e:
+                    conn.send(e)
+
+
+def _with_timeout(fn, timeout):
+    """fn() i en egen tråd; TimeoutError om den inte blir klar i tid."""
+    future = Future()
+
+    def run():
+        try:
+            future.set_result(fn())
+        except BaseException as e:
+            future.set_exception(e)
+
+    threading.Thread(target=run, name="EncoderConnect", daemon=True).start()
+    try:
+        return future.result(timeout)
+    except TimeoutError:
+        if future.done():
+            raise
+        raise TimeoutError(f"Ingen anslutning till EncoderServer inom {timeout} s") from None
+
+
+def _recv(conn, timeout):
+    if not conn.poll(timeout):
+        raise TimeoutError(f"Inget svar från EncoderServer inom {timeout} s")
+    return conn.recv()
+
+
+def open_encoder_connection(address, authkey, timeout=ENCODE_TIMEOUT):
+    """Ansluter till EncoderServer: (anslutning, (model_id, backend)).
+
+    Fel (nere, omstart, hänger) blir OSError eller EOFError."""
+    _require_authkey(authkey)
+    # Autentiseringen i Client() har ingen timeout och körs därför i en egen tråd
+    conn = _with_timeout(lambda: Client(address, authkey=authkey), timeout)
+    try:
+        return conn, _recv(conn, timeout)
+    except BaseException:
+        conn.close()
+        raise
+
+
+class RemoteEncoder:
+    """Klient till EncoderServer med samma gränssnitt som MicroBatcher.encode.
+
+    En anslutning per tråd; ansluter vid första anropet. Väntar högst
+    timeout sekunder på indexeraren; fel blir OSError eller EOFError."""
+
+    def __init__(self, address, authkey, timeout=ENCODE_TIMEOUT):
+        _require_authkey(authkey)
+        self.address = address
+        self.authkey = authkey
+        self.timeout = timeout
+        self.backend = "remote"
+        self._model_id = None
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn, (self._model_id, backend) = open_encoder_connection(self.address, self.authkey, self.timeout)
+            self.backend = "remote:" + backend
+            self._local.conn = conn
+        return conn
+
+    @property
+    def model_id(self):
+        if self._model_id is None:
+            self._connection()
+        return self._model_id
+
+    def encode(self, text):
+        conn = self._connection()
+        try:
+            conn.send(text)
+            result = _recv(conn, self.timeout)
+        except (EOFError, OSError):
+            # Indexeraren har startats om eller hänger: anslut på nytt vid nästa anrop
+            self._local.conn = None
+            conn.close()
+            raise
+        if isinstance(result, Exception):
+            raise result
+        return result
@@ -0,0 +1,99 @@
+import os
+import json
+import hashlib
+import threading
+import numpy as np
+
+from extraction_cache import CACHE_DIR
+
+# === Persistent lagring av embeddings ===
+# En float32-matris (.npy, memory-mappad vid läsning) plus ett manifest med
+# id och textfingeravtryck per rad. Bara texter vars fingeravtryck (eller
+# modellnamn) ändrats kodas om vid omstart.
+
+
+def text_fingerprint(text):
+    return hashlib.sha1(text.encode("utf-8")).hexdigest()
+
+
+class EmbeddingStore:
+    def __init__(self, model_name, directory=None, name="embeddings"):
+        self.model_name = model_name
+        self.directory = directory or CACHE_DIR
+        os.makedirs(self.directory, exist_ok=True)
+        self.matrix_path = os.path.join(self.directory, f"{name}.npy")
+        self.manifest_path = os.path.join(self.directory, f"{name}.json")
+        self.ids = []
+        self.fingerprints = []
+        self.matrix = None
+        # Passager som EmbeddingPipeline kodat i förväg (fingeravtryck -> vektor)
+        self._fresh = {}
+        self._lock = threading.Lock()
+        self._load()
+
+    def _load(self):
+        try:
+            with open(self.manifest_path, encoding="utf-8") as f:
+                manifest = json.load(f)
+            matrix = np.load(self.matrix_path, mmap_mode="r")
+        except (OSError, ValueError):
+            return
+        if manifest.get("model") != self.model_name or len(manifest.get("fingerprints", [])) != len(matrix):
+            return
+        self.ids = manifest["ids"]
+        self.fingerprints = manifest["fingerprints"]
+        self.matrix = matrix
+
+    def _save(self, ids, fingerprints, matrix):
+        tmp_matrix = self.matrix_path + ".tmp.npy"
+        tmp_manifest = self.manifest_path + ".tmp"
+        np.save(tmp_matrix, matrix)
+        with open(tmp_manifest, "w", encoding="utf-8") as f:
+            json.dump({"model": self.model_name, "dim": int(matrix.shape[1]), "ids": ids, "fingerprints": fingerprints}, f)
+        # Matrisen först: ett manifest som pekar på fel matris avvisas av _load
+        os.replace(tmp_matrix, self.matrix_path)
+        os.replace(tmp_manifest, self.manifest_path)
+        self.ids = ids
+        self.fingerprints = fingerprints
+        self.matrix = np.load(self.matrix_path, mmap_mode="r")
+
+    def prefetch(self, texts, encode, batch_size=32):
+        """Kodar i förväg de texter som varken finns lagrade eller redan förkodats."""
+        with self._lock:
+            known = set(self.fingerprints) | set(self._fresh)
+        missing = {}
+        for text in texts:
+            fp = text_fingerprint(text)
+            if fp not in known:
+                missing[fp] = text
+        if missing:
+            vectors = np.asarray(encode(list(missing.values()), batch_size=batch_size), dtype=np.float32)
+            with self._lock:
+                self._fresh.update(zip(missing, vectors))
+
+    def sync(self, ids, texts, encode, batch_size=32):
+        """Returnerar en (N, d)-matris i samma ordning som texts."""
+        fingerprints = [text_fingerprint(t) for t in texts]
+        if not fingerprints:
+            return np.empty((0, 0), dtype=np.float32)
+        if self.matrix is not None and fingerprints == self.fingerprints and list(ids) == self.ids:
+            return self.matrix
+
+        known = {}
+        if self.matrix is not None:
+            known = {fp: row for row, fp in enumerate(self.fingerprints)}
+
+        with self._lock:
+            encoded, self._fresh = self._fresh, {}
+        missing = [i for i, fp in enumerate(fingerprints) if fp not in known and fp not in encoded]
+        if missing:
+            vectors = np.asarray(encode([texts[i] for i in missing], batch_size=batch_size), dtype=np.float32)
+            encoded.update((fingerprints[i], vec) for i, vec in zip(missing, vectors))
+
+        dim = self.matrix.shape[1] if self.matrix is not None else next(iter(encoded.values())).shape[0]
+        matrix = np.empty((len(texts), dim), dtype=np.float32)
+        for i, fp in enumerate(fingerprints):
+            matrix[i] = encoded[fp] if fp in encoded else self.matrix[known[fp]]
+
+        self._save(list(ids), fingerprints, matrix)
+        return self.matrix
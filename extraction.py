@@ -0,0 +1,177 @@
+import os
+import atexit
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+# === Textextraktion för PDF/DOCX ===
+# Funktionerna ligger på modulnivå så att de kan skickas till en processpool.
+# Fel isoleras per fil: i stället för ett undantag returneras en felsträng
+# ("PDF ERROR: ...") som visas i sökresultatet men aldrig cachas.
+# PyMuPDF och python-docx importeras först när en fil extraheras, så en app
+# (eller arbetare) som läser färdiga index startar utan dem.
+
+# Skiljetecken mellan sidor (PDF) / rubrikavsnitt (DOCX) i *_pages-varianterna
+PAGE_BREAK = "\f"
+
+# Antal PDF-sidor per deluppgift när stora PDF:er delas upp mellan processer
+PAGES_PER_TASK = 40
+
+
+def is_extraction_error(content):
+    return content.startswith(("PDF ERROR:", "DOCX ERROR:"))
+
+
+def extract_pdf_range(path, start=0, stop=None, separator="\n"):
+    try:
+        import fitz
+        with fitz.open(path) as doc:
+            stop = doc.page_count if stop is None else min(stop, doc.page_count)
+            return separator.join(
+                doc[i].get_text().replace(PAGE_BREAK, " ") for i in range(start, stop)
+            )
+    except Exception as e:
+        return f"PDF ERROR: {e}"
+
+
+def pdf_page_count(path):
+    try:
+        import fitz
+        with fitz.open(path) as doc:
+            return doc.page_count
+    except Exception:
+        return 0
+
+
+def extract_text_from_pdf(path):
+    return extract_pdf_range(path, separator="\n")
+
+
+def extract_pages_from_pdf(path):
+    return extract_pdf_range(path, separator=PAGE_BREAK)
+
+
+def extract_text_from_docx(path):
+    try:
+        from docx import Document
+        doc = Document(path)
+        return "\n".join(p.text for p in doc.paragraphs)
+    except Exception as e:
+        return f"DOCX ERROR: {e}"
+
+
+def extract_sections_from_docx(path):
+    try:
+        from docx import Document
+        doc = Document(path)
+    except Exception as e:
+        return f"DOCX ERROR: {e}"
+    sections = [""]
+    for para in doc.paragraphs:
+        if para.style.name.startswith("Heading") and sections[-1].strip():
+            sections.append("")
+        sections[-1] += para.text.replace(PAGE_BREAK, " ") + "\n"
+    return PAGE_BREAK.join(sections)
+
+
+# PDF-extraktorer som kan delas upp per sidintervall, med sitt skiljetecken
+PDF_RANGE_SEPARATORS = {
+    "extract_text_from_pdf": "\n",
+    "extract_pages_from_pdf": PAGE_BREAK,
+}
+
+
+_pool = None
+
+
+def _pool_context():
+    # fork krävs: med spawn skulle varje arbetsprocess importera om appen och
+    # bygga om hela indexet. Utan fork körs extraktionen sekventiellt.
+    if "fork" in multiprocessing.get_all_start_methods():
+        return multiprocessing.get_context("fork")
+    return None
+
+
+def start_pool(max_workers=None):
+    """Startar processpoolen som extract_many använder, en gång per process.
+
+    Måste anropas innan appen startar några trådar (webbserver, uppvärmning,
+    bevakning, modellens trådpool): att forka en process med trådar kan låsa
+    sig på lås som en annan tråd höll vid forken. Poolen återanvänds sedan
+    vid varje omindexering. Utan pool extraheras filerna sekventiellt.
+    """
+    global _pool
+    workers = max_workers or os.cpu_count() or 1
+    context = _pool_context()
+    if _pool is not None or context is None or workers < 2:
+        return _pool
+    _pool = ProcessPoolExecutor(max_workers=workers, mp_context=context)
+    # Med fork startas alla arbetsprocesser vid första uppgiften: gör det nu,
+    # medan processen fortfarande bara har en tråd
+    _pool.submit(int).result()
+    atexit.register(_pool.shutdown)
+    return _pool
+
+
+def extract_many(jobs, cache=None, pages_per_task=PAGES_PER_TASK):
+    """Extraherar [(sökväg, extraktor), ...] i processpoolen (start_pool).
+
+    Genererar (sökväg, text) i den ordning filerna blir klara. Cacheträffar
+    kommer först, utan att poolen används.
+    """
+    global _pool
+    misses = []
+    for path, extractor in jobs:
+        content = cache.get(path, extractor.__name__) if cache is not None else None
+        if content is None:
+            misses.append((path, extractor))
+        else:
+            yield path, content
+
+    pool = _pool
+    if pool is not None and misses:
+        try:
+            # Kastar BrokenProcessPool om en arbetsprocess har dött: poolen
+            # kan inte ersättas utan en ny fork, så resten körs sekventiellt
+            pool.submit(int).result()
+        except BrokenProcessPool:
+            _pool = pool = None
+    if pool is None:
+        for path, extractor in misses:
+            yield path, _store(cache, path, extractor, extractor(path))
+        return
+
+    futures = {}
+    parts = {}
+    for path, extractor in misses:
+        separator = PDF_RANGE_SEPARATORS.get(extractor.__name__)
+        pages = pdf_page_count(path) if separator is not None else 0
+        if pages > pages_per_task:
+            ranges = [(start, min(start + pages_per_task, pages)) for start in range(0, pages, pages_per_task)]
+            parts[path] = [None] * len(ranges)
+            for part, (start, stop) in enumerate(ranges):
+                futures[pool.submit(extract_pdf_range, path, start, stop, separator)] = (path, extractor, part)
+        else:
+            parts[path] = [None]
+            futures[pool.submit(extractor, path)] = (path, extractor, 0)
+
+    for future in as_completed(futures):
+        path, extractor, part = futures[future]
+        try:
+            parts[path][part] = future.result()
+        except Exception as e:
+            # T.ex. en arbetsprocess som kraschat på en trasig fil
+            parts[path][part] = f"{'PDF' if path.lower().endswith('.pdf') else 'DOCX'} ERROR: {e}"
+        if all(p is not None for p in parts[path]):
+            separator = PDF_RANGE_SEPARATORS.get(extractor.__name__, "\n")
+            chunks = parts.pop(path)
+            content = next((c for c in chunks if is_extraction_error(c)), None)
+            if content is None:
+                content = separator.join(chunks)
+            yield path, _store(cache, path, extractor, content)
+
+
+def _store(cache, path, extractor, content):
+    if cache is not None and not is_extraction_error(content):
+        cache.put(path, extractor.__name__, content)
+    return content
@@ -0,0 +1,97 @@
+import os
+import hashlib
+import sqlite3
+import threading
+
+from extraction import is_extraction_error
+
+# === Persistent cache för extraherad text ===
+# Nyckel: sökväg + mtime + storlek. Om mtime/storlek ändrats men innehållet
+# är identiskt (t.ex. filen har kopierats om) räcker SHA-1 för att slippa
+# extrahera om. Olika extraktorer (hel text, text per sida, ...) cachas
+# separat via kolumnen kind = extraktorns namn.
+
+CACHE_DIR = os.environ.get("NOGUIDE_CACHE_DIR", ".noguide_cache")
+SCHEMA_VERSION = 2
+
+
+def file_sha1(path, chunk_size=1024 * 1024):
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(chunk_size), b""):
+            h.update(block)
+    return h.hexdigest()
+
+
+class ExtractionCache:
+    def __init__(self, db_path=None):
+        if db_path is None:
+            db_path = os.path.join(CACHE_DIR, "extraction.sqlite")
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.db_path = db_path
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(db_path, check_same_thread=False)
+        if self._conn.execute("PRAGMA user_version").fetchone()[0] != SCHEMA_VERSION:
+            self._conn.execute("DROP TABLE IF EXISTS extracted")
+            self._conn.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS extracted ("
+            " path TEXT NOT NULL,"
+            " kind TEXT NOT NULL,"
+            " mtime_ns INTEGER NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " sha1 TEXT NOT NULL,"
+            " content TEXT NOT NULL,"
+            " PRIMARY KEY (path, kind))"
+        )
+        self._conn.commit()
+
+    def get(self, path, kind):
+        key = os.path.abspath(path)
+        stat = os.stat(path)
+
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT mtime_ns, size, sha1, content FROM extracted WHERE path = ? AND kind = ?", (key, kind)
+            ).fetchone()
+        if row is None:
+            return None
+        if row[0] == stat.st_mtime_ns and row[1] == stat.st_size:
+            return row[3]
+        if row[2] == file_sha1(path):
+            self.put(path, kind, row[3])
+            return row[3]
+        return None
+
+    def put(self, path, kind, content):
+        key = os.path.abspath(path)
+        stat = os.stat(path)
+        sha1 = file_sha1(path)
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO extracted (path, kind, mtime_ns, size, sha1, content) VALUES (?, ?, ?, ?, ?, ?)",
+                (key, kind, stat.st_mtime_ns, stat.st_size, sha1, content),
+            )
+            self._conn.commit()
+
+    def get_or_extract(self, path, extractor):
+        content = self.get(path, extractor.__name__)
+        if content is None:
+            content = extractor(path)
+            # Felsträngar cachas inte, så att t.ex. en låst fil provas igen
+            if not is_extraction_error(content):
+                self.put(path, extractor.__name__, content)
+        return content
+
+    def prune(self, folder, keep_paths):
+        # Ta bort poster för filer i mappen som inte längre finns kvar
+        prefix = os.path.join(os.path.abspath(folder), "")
+        keep = {os.path.abspath(p) for p in keep_paths}
+        with self._lock:
+            stale = [
+                p for (p,) in self._conn.execute("SELECT path FROM extracted")
+                if p.startswith(prefix) and p not in keep
+            ]
+            self._conn.executemany("DELETE FROM extracted WHERE path = ?", [(p,) for p in stale])
+            self._conn.commit()
+        return len(stale)
@@ -0,0 +1,70 @@
+import re
+import json
+
+from pygments import highlight
+from pygments.filter import simplefilter
+from pygments.formatters import HtmlFormatter
+from pygments.lexers import PythonLexer, SqlLexer, JsonLexer, TextLexer
+from pygments.token import Text, Whitespace
+
+# === Syntaxfärgning av Bibliotek-avsnitt ===
+# Formattern skriver CSS-klasser i stället för inline-stilar; stilarket
+# (STYLESHEET) serveras en gång via egen URL. Lexern väljs utifrån texten:
+# de flesta avsnitt är vanlig prosa och ska inte färgas som Python.
+
+STYLE = "friendly"
+CSS_CLASS = "highlight"
+
+FORMATTER = HtmlFormatter(style=STYLE, cssclass=CSS_CLASS)
+STYLESHEET = FORMATTER.get_style_defs("." + CSS_CLASS)
+
+# Minsta antal kodmarkörer för att ett avsnitt ska räknas som kod
+MIN_CODE_MARKERS = 3
+
+SQL_MARKERS = re.compile(
+    r"\b(?:SELECT|FROM|WHERE|JOIN|GROUP BY|ORDER BY|INSERT INTO|UPDATE|DECLARE|BEGIN|END|CASE|WHEN|THEN)\b|@\w+"
+)
+PYTHON_MARKERS = re.compile(
+    r"^\s*(?:def |class |import |from \S+ import |elif |return\b|for \w+ in )|\bself\.|\bprint\(",
+    re.MULTILINE,
+)
+JSON_MARKERS = re.compile(r'"[^"\n]+"\s*:')
+
+
+@simplefilter
+def plain_whitespace(self, lexer, stream, options):
+    # Blanktecken som vanlig text: ingen <span class="w"> runt varje mellanrum
+    for ttype, value in stream:
+        yield (Text if ttype in Whitespace else ttype), value
+
+
+_LEXERS = {
+    "python": PythonLexer(),
+    "sql": SqlLexer(),
+    "json": JsonLexer(),
+    "text": TextLexer(),
+}
+for _lexer in _LEXERS.values():
+    _lexer.add_filter(plain_whitespace())
+
+
+def select_lexer_name(text):
+    stripped = text.strip()
+    if stripped[:1] in ("{", "["):
+        try:
+            json.loads(stripped)
+            return "json"
+        except ValueError:
+            pass
+
+    markers = {
+        "sql": len(SQL_MARKERS.findall(text)),
+        "python": len(PYTHON_MARKERS.findall(text)),
+        "json": len(JSON_MARKERS.findall(text)),
+    }
+    best = max(markers, key=markers.get)
+    return best if markers[best] >= MIN_CODE_MARKERS else "text"
+
+
+def highlight_text(text):
+    return highlight(text, _LEXERS[select_lexer_name(text)], FORMATTER)
@@ -0,0 +1,181 @@
+import re
+import math
+from bisect import bisect_left
+from collections import Counter, defaultdict
+from rapidfuzz import fuzz
+
+# === Inverterat index med prefix- och trigramuppslag ===
+# Texten gemenkonverteras och tokeniseras en gång när indexet byggs. Vid
+# sökning expanderas varje sökord till de termer i vokabulären som matchar
+# exakt, som prefix, som delord (svenska sammansättningar: "pall" i
+# "helpall") eller med stavfel, och den dyra fuzzy-jämförelsen körs bara mot
+# de få termer som trigramindexet föreslår – aldrig mot hela dokumenttexter.
+
+TOKEN_RE = re.compile(r"\w+")
+
+SWEDISH_STOPWORDS = frozenset("""
+alla allt att av blev bli blir de dem den denna deras dess det detta dig din
+dina ditt du där efter ej eller en er era ert ett från för ha hade han hans
+har hon honom hur här i icke ingen inom inte jag ju kan kunde man med mellan
+men mig min mina mitt mot mycket ni nu när någon något några och om oss på
+samma sedan sig sin sina sitta själv skulle som så sådan till under upp ut
+utan vad var vara varför varit varje vars vi vid vilka vilken vilket vår våra
+vårt än är åt över
+""".split())
+
+
+def tokenize(text):
+    return TOKEN_RE.findall(text.lower())
+
+
+def swedish_stem(token):
+    """Lätt svensk suffixstympning (samma regler som Lucenes SwedishLightStemmer)."""
+    n = len(token)
+    if n > 4 and token[-1] == "s":
+        n -= 1
+    word = token[:n]
+    if n > 7 and word.endswith(("elser", "heten")):
+        return word[:-5]
+    if n > 6 and word.endswith(("arna", "erna", "ande", "else", "aste", "orna", "aren")):
+        return word[:-4]
+    if n > 5 and word.endswith(("are", "ast", "het")):
+        return word[:-3]
+    if n > 4 and word.endswith(("ar", "er", "or", "en", "at", "te", "et")):
+        return word[:-2]
+    if n > 3 and word[-1] in "tean":
+        return word[:-1]
+    return word
+
+
+def query_terms(query):
+    """Sökorden utan stoppord, stympade så att prefixuppslag täcker böjningsformer."""
+    tokens = tokenize(query)
+    content = [t for t in tokens if t not in SWEDISH_STOPWORDS] or tokens
+    return [swedish_stem(t) for t in content]
+
+
+def trigrams(term):
+    return {term[i:i + 3] for i in range(len(term) - 2)}
+
+
+class LexicalIndex:
+    def __init__(self, texts, fuzzy_threshold=80, max_expansions=50, k1=1.2, b=0.75):
+        self.fuzzy_threshold = fuzzy_threshold
+        self.max_expansions = max_expansions
+        self.k1 = k1
+        self.b = b
+
+        self.postings = defaultdict(dict)
+        self.doc_lengths = []
+        for doc_id, text in enumerate(texts):
+            tokens = tokenize(text)
+            self.doc_lengths.append(len(tokens))
+            for term, tf in Counter(tokens).items():
+                self.postings[term][doc_id] = tf
+        self.postings = dict(self.postings)
+        # texts kan vara en generator (texten avkodas ett dokument i taget)
+        self.num_docs = len(self.doc_lengths)
+
+        # Termstatistik för BM25: längdnormalisering per dokument förberäknas
+        avgdl = (sum(self.doc_lengths) / len(self.doc_lengths)) if self.doc_lengths else 0.0
+        self.length_norms = [
+            k1 * (1 - b + b * dl / avgdl) if avgdl else k1 for dl in self.doc_lengths
+        ]
+
+        self.vocab = sorted(self.postings)
+        self.trigram_index = defaultdict(list)
+        for term in self.vocab:
+            for gram in trigrams(term):
+                self.trigram_index[gram].append(term)
+        self.trigram_index = dict(self.trigram_index)
+        self._expansions = {}
+
+    def _prefix_terms(self, token):
+        terms = []
+        i = bisect_left(self.vocab, token)
+        while i < len(self.vocab) and self.vocab[i].startswith(token) and len(terms) < self.max_expansions:
+            terms.append(self.vocab[i])
+            i += 1
+        return terms
+
+    @staticmethod
+    def _fuzzy_score(token, term):
+        # Längre termer jämförs delvis så att stavfel i förleden av en
+        # sammansättning fortfarande hittas
+        if len(term) > len(token):
+            return fuzz.partial_ratio(token, term)
+        if len(token) - len(term) <= 2:
+            return fuzz.ratio(token, term)
+        return 0
+
+    def expand_term(self, token):
+        """Termer i vokabulären som sökordet ska räknas som träff på."""
+        if token in self._expansions:
+            return self._expansions[token]
+
+        terms = set(self._prefix_terms(token))
+        grams = trigrams(token)
+        if grams:
+            shared = Counter()
+            for gram in grams:
+                shared.update(self.trigram_index.get(gram, ()))
+
+            # Delord: termen innehåller alla sökordets trigram och sökordet självt
+            for term, count in shared.items():
+                if count == len(grams) and token in term and len(terms) < self.max_expansions:
+                    terms.add(term)
+
+            # Stavfelstolerans bara när inget annat matchar. Ett stavfel eller
+            # en bokstavsväxling slår ut högst fyra trigram.
+            if not terms and len(token) >= 5:
+                min_shared = max(1, min(len(grams) - 4, len(grams) // 2))
+                for term, count in shared.most_common():
+                    if count < min_shared or len(terms) >= self.max_expansions:
+                        break
+                    if self._fuzzy_score(token, term) >= self.fuzzy_threshold:
+                        terms.add(term)
+
+        if len(self._expansions) > 10000:
+            self._expansions.clear()
+        self._expansions[token] = terms
+        return terms
+
+    def match(self, query):
+        """Dokument där varje sökord träffar minst en term, samt de matchade termerna."""
+        tokens = query_terms(query)
+        if not tokens:
+            return set(), set()
+
+        docs = None
+        matched_terms = set()
+        for token in tokens:
+            token_docs = set()
+            for term in self.expand_term(token):
+                token_docs.update(self.postings[term])
+                matched_terms.add(term)
+            docs = token_docs if docs is None else docs & token_docs
+            if not docs:
+                return set(), matched_terms
+        return docs, matched_terms
+
+    def bm25(self, query, expansion_weight=0.5):
+        """BM25-poäng per dokument för dokument som träffar minst ett sökord.
+
+        Varje sökord räknas som en grupp av sina expanderade termer. Termer som
+        börjar med sökordet (böjningsformer) väger fullt, delord och stavfel
+        väger expansion_weight.
+        """
+        scores = defaultdict(float)
+        for token in query_terms(query):
+            group_tf = defaultdict(float)
+            for term in self.expand_term(token):
+                weight = 1.0 if term.startswith(token) else expansion_weight
+                for doc_id, tf in self.postings[term].items():
+                    group_tf[doc_id] += weight * tf
+            if not group_tf:
+                continue
+            df = len(group_tf)
+            idf = math.log(1 + (self.num_docs - df + 0.5) / (df + 0.5))
+            for doc_id, tf in group_tf.items():
+                scores[doc_id] += idf * tf * (self.k1 + 1) / (tf + self.length_norms[doc_id])
+        return dict(scores)
@@ -0,0 +1,268 @@
+import os
+import sys
+import json
+import time
+import threading
+import ipaddress
+from bisect import bisect_left
+from collections import Counter
+from contextlib import contextmanager
+
+from extraction_cache import CACHE_DIR
+from query_cache import all_stats
+
+# === Mätvärden per söksteg ===
+# Varje steg i en sökning (kodning av frågan, kandidater, poängsättning,
+# sortering, utdrag, rendering) tidtas med stage() och hamnar i histogram som
+# exponeras i Prometheus textformat på /metrics (web_app.add_metrics_route).
+# Stegen kan vara nästlade: "render" innefattar "snippet".
+#
+# En sökning omsluts av en QueryTrace. Tar den längre än NOGUIDE_SLOW_QUERY_MS
+# skrivs en rad med tider per steg till slow_queries.jsonl i cachekatalogen.
+# Med NOGUIDE_PROFILE_INTERVAL_MS > 0 samplas dessutom stacken i tråden som
+# kör sökningen, och de vanligaste stackarna (folded-format, för flamegraph)
+# följer med i raden.
+#
+# /metrics och /statistik/cache (LOCAL_ONLY_PATHS) svarar bara klienter på
+# loopback: appen lyssnar på 0.0.0.0, men stegtider och cachestatistik är
+# till för en lokal Prometheus, inte för användarna.
+
+LOCAL_ONLY_PATHS = frozenset({"/metrics", "/statistik/cache"})
+
+SLOW_QUERY_SECONDS = float(os.environ.get("NOGUIDE_SLOW_QUERY_MS", 0)) / 1000
+PROFILE_INTERVAL = float(os.environ.get("NOGUIDE_PROFILE_INTERVAL_MS", 0)) / 1000
+SLOW_QUERY_LOG = os.path.join(CACHE_DIR, "slow_queries.jsonl")
+MAX_STACKS = 50
+
+LATENCY_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+BYTE_BUCKETS = (1024, 4096, 16384, 65536, 262144, 1048576, 4194304)
+
+_registry = []
+_registry_lock = threading.Lock()
+_local = threading.local()
+
+
+def _format_labels(labels):
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for value in labels.values())
+    return "{" + ",".join(f'{key}="{value}"' for key, value in zip(labels, escaped)) + "}"
+
+
+class Histogram:
+    def __init__(self, name, help, buckets=LATENCY_BUCKETS):
+        self.name = name
+        self.help = help
+        self.buckets = tuple(buckets)
+        self._series = {}
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def observe(self, value, **labels):
+        key = tuple(sorted(labels.items()))
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [[0] * (len(self.buckets) + 1), 0.0]
+            series[0][index] += 1
+            series[1] += value
+
+    def expose(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            series = [(dict(key), list(counts), total) for key, (counts, total) in sorted(self._series.items())]
+        for labels, counts, total in series:
+            cumulative = 0
+            for bound, count in zip(self.buckets + ("+Inf",), counts):
+                cumulative += count
+                lines.append(f"{self.name}_bucket{_format_labels(dict(labels, le=bound))} {cumulative}")
+            lines.append(f"{self.name}_sum{_format_labels(labels)} {total}")
+            lines.append(f"{self.name}_count{_format_labels(labels)} {cumulative}")
+        return lines
+
+
+STAGE_SECONDS = Histogram("noguide_search_stage_seconds", "Tid per söksteg (encode, candidates, scoring, sort, snippet, render).")
+SEARCH_SECONDS = Histogram("noguide_search_seconds", "Total aktiv tid per sökning.")
+PAYLOAD_BYTES = Histogram("noguide_search_payload_bytes", "Storlek på renderad resultat-HTML.", BYTE_BUCKETS)
+
+
+@contextmanager
+def stage(name):
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_SECONDS.observe(elapsed, stage=name)
+        trace = getattr(_local, "trace", None)
+        if trace is not None:
+            trace.stages[name] += elapsed
+
+
+def observe_payload(html, **labels):
+    PAYLOAD_BYTES.observe(len(html.encode("utf-8")), **labels)
+    return html
+
+
+# === Samplande profilerare för långsamma sökningar ===
+
+class SamplingProfiler:
+    """En tråd som med jämna mellanrum läser stacken i de trådar som just nu
+    kör en QueryTrace (sys._current_frames) och räknar stackarna per trace."""
+
+    def __init__(self, interval):
+        self.interval = interval
+        self._active = {}
+        self._lock = threading.Lock()
+        # Tråden startar vid första sökningen, inte vid import (extraction.start_pool
+        # måste kunna forka innan processen har några trådar)
+        self._thread = None
+
+    def attach(self, trace):
+        with self._lock:
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="SamplingProfiler", daemon=True)
+                self._thread.start()
+            self._active[threading.get_ident()] = trace
+
+    def detach(self):
+        with self._lock:
+            self._active.pop(threading.get_ident(), None)
+
+    @staticmethod
+    def _folded(frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{frame.f_lineno})")
+            frame = frame.f_back
+        return ";".join(reversed(names))
+
+    def _run(self):
+        while True:
+            time.sleep(self.interval)
+            with self._lock:
+                active = dict(self._active)
+            if not active:
+                continue
+            frames = sys._current_frames()
+            for ident, trace in active.items():
+                frame = frames.get(ident)
+                if frame is not None:
+                    trace.samples[self._folded(frame)] += 1
+
+
+profiler = SamplingProfiler(PROFILE_INTERVAL) if PROFILE_INTERVAL > 0 and SLOW_QUERY_SECONDS > 0 else None
+
+
+class QueryTrace:
+    """Tider för en sökning. Används som `with QueryTrace(...)` eller, för
+    sökningar som körs i flera steg (strömmande), via traced()."""
+
+    def __init__(self, kind, query, **labels):
+        self.kind = kind
+        self.query = query
+        self.labels = labels
+        self.active = 0.0
+        self.stages = Counter()
+        self.samples = Counter()
+
+    @contextmanager
+    def resumed(self):
+        """Ett avsnitt av sökningen i den aktuella tråden."""
+        previous = getattr(_local, "trace", None)
+        _local.trace = self
+        if profiler is not None:
+            profiler.attach(self)
+        started = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.active += time.perf_counter() - started
+            if profiler is not None:
+                profiler.detach()
+            _local.trace = previous
+
+    def finish(self):
+        SEARCH_SECONDS.observe(self.active, kind=self.kind, **self.labels)
+        if SLOW_QUERY_SECONDS and self.active >= SLOW_QUERY_SECONDS:
+            self._log_slow()
+
+    def _log_slow(self):
+        entry = {
+            "time": time.strftime("%Y-%m-%dT%H:%M:%S"),
+            "kind": self.kind,
+            "query": self.query,
+            "labels": self.labels,
+            "seconds": round(self.active, 4),
+            "stages": {name: round(seconds, 4) for name, seconds in self.stages.items()},
+        }
+        if self.samples:
+            entry["stacks"] = dict(self.samples.most_common(MAX_STACKS))
+        try:
+            os.makedirs(os.path.dirname(SLOW_QUERY_LOG) or ".", exist_ok=True)
+            with open(SLOW_QUERY_LOG, "a", encoding="utf-8") as f:
+                f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+        except OSError:
+            pass
+
+    def __enter__(self):
+        self._resumed = self.resumed()
+        return self._resumed.__enter__()
+
+    def __exit__(self, *exc):
+        self._resumed.__exit__(*exc)
+        self.finish()
+
+
+def traced(trace, steps):
+    """Kör generatorn steg för steg med trace aktiv. Varje steg kan köras i
+    en annan tråd (SearchDebouncer.stream); bara tiden i stegen räknas."""
+    try:
+        while True:
+            with trace.resumed():
+                try:
+                    item = next(steps)
+                except StopIteration:
+                    return
+            yield item
+    finally:
+        steps.close()
+        trace.finish()
+
+
+# === Prometheus-export ===
+
+def is_local_client(host):
+    """host: klientens adress (request.client.host), None om den saknas."""
+    if host is None:
+        return False
+    try:
+        address = ipaddress.ip_address(host)
+    except ValueError:
+        return False
+    if address.version == 6 and address.ipv4_mapped is not None:
+        address = address.ipv4_mapped
+    return address.is_loopback
+
+
+def render_metrics():
+    lines = []
+    with _registry_lock:
+        histograms = list(_registry)
+    for histogram in histograms:
+        lines.extend(histogram.expose())
+
+    # Frågecacharna (query_cache.py) som räknare
+    caches = all_stats()
+    for name, field, kind, help in (
+        ("noguide_cache_hits_total", "hits", "counter", "Träffar i frågecachen."),
+        ("noguide_cache_misses_total", "misses", "counter", "Missar i frågecachen."),
+        ("noguide_cache_entries", "size", "gauge", "Antal poster i frågecachen."),
+    ):
+        lines.append(f"# HELP {name} {help}")
+        lines.append(f"# TYPE {name} {kind}")
+        lines.extend(f"{name}{_format_labels({'cache': stats['name']})} {stats[field]}" for stats in caches)
+    return "\n".join(lines) + "\n"
@@ -0,0 +1,58 @@
+# === Sessionsbunden resultatmarkör för "Visa fler" ===
+# Sökningen rankas en gång och rankningen sparas i sessionens gr.State. "Visa
+# fler" renderar bara nästa sida och lägger till den, i stället för att söka
+# om med fler synliga träffar.
+#
+# Markören håller bara indexversionen, resultatens nycklar (t.ex. dokument-
+# index och poäng) och den renderade HTML:en – aldrig själva indexbilden, så
+# öppna sessioner inte håller gamla index (och deras mappade filer) vid liv
+# efter en omindexering. Nycklarna slås upp i den aktuella indexbilden; har
+# den bytts sedan sökningen släpps markören.
+
+PAGE_SIZE = 5
+
+
+class ResultCursor:
+    def __init__(self, index, snapshot, query, results, cache_key=None):
+        """index: IndexHolder; results: nycklar som render_page slår upp i snapshot."""
+        self.index = index
+        self.version = snapshot.version
+        self.query = query
+        self.results = results
+        self.cache_key = cache_key
+        self.shown = 0
+        self.html = ""
+
+    @property
+    def has_more(self):
+        return self.shown < len(self.results)
+
+    def next_page(self, render_page, page_cache=None, page_size=PAGE_SIZE, snapshot=None):
+        """render_page(snapshot, query, resultat) -> HTML för just de resultaten.
+
+        snapshot: indexbilden sökningen gjordes mot, om anroparen har den; annars
+        index.current. Returnerar None (och renderar inget) om indexet har bytts
+        sedan sökningen – markören ska då släppas."""
+        if snapshot is None:
+            snapshot = self.index.current
+        if snapshot.version != self.version:
+            return None
+        start = self.shown
+        end = min(start + page_size, len(self.results))
+        if end > start:
+            render = lambda: render_page(snapshot, self.query, self.results[start:end])
+            if page_cache is not None and self.cache_key is not None:
+                fragment = page_cache.get_or_compute(self.cache_key + (start, end), render)
+            else:
+                fragment = render()
+            self.html += fragment
+        self.shown = end
+        return self
+
+    def iter_page(self, render_page, page_cache=None, page_size=PAGE_SIZE, snapshot=None):
+        """Som next_page, men en träff i taget: lämnar markören efter varje
+        renderad träff så att den kan visas direkt (strömmande sökning)."""
+        for _ in range(min(page_size, len(self.results) - self.shown)):
+            if self.next_page(render_page, page_cache, page_size=1, snapshot=snapshot) is None:
+                return
+            yield self
@@ -0,0 +1,91 @@
+import time
+import threading
+from collections import OrderedDict
+
+# === LRU/TTL-cache för sökfrågor ===
+# Samma handfull frågor ("pall", "inventering", ...) ställs hela dagen. Nycklar
+# byggs av normaliserad fråga, sorteringsläge, sida osv. plus indexversionen
+# (IndexSnapshot.version), så ett omindexerat bibliotek ger automatiskt
+# cachemissar och gamla poster trängs ut av LRU-ordningen.
+
+MISSING = object()
+
+_registry = []
+_registry_lock = threading.Lock()
+
+
+def normalize_query(query):
+    return " ".join(query.lower().split())
+
+
+class QueryCache:
+    def __init__(self, name, maxsize=256, ttl=None):
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        with _registry_lock:
+            _registry.append(self)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None and (self.ttl is None or time.monotonic() - entry[0] < self.ttl):
+                self._data.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            if entry is not None:
+                del self._data[key]
+            self.misses += 1
+            return MISSING
+
+    def __contains__(self, key):
+        """Finns en giltig post? Räknas inte som träff eller miss."""
+        with self._lock:
+            entry = self._data.get(key)
+            return entry is not None and (self.ttl is None or time.monotonic() - entry[0] < self.ttl)
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = (time.monotonic(), value)
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def get_or_compute(self, key, compute):
+        value = self.get(key)
+        if value is MISSING:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+
+    def stats(self):
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "name": self.name,
+                "size": len(self._data),
+                "maxsize": self.maxsize,
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / lookups, 4) if lookups else 0.0,
+            }
+
+
+def clear_all():
+    with _registry_lock:
+        caches = list(_registry)
+    for cache in caches:
+        cache.clear()
+
+
+def all_stats():
+    with _registry_lock:
+        return [cache.stats() for cache in _registry]
@@ -0,0 +1,19 @@
+# === Rangfusion ===
+# Reciprocal rank fusion: varje ranking bidrar med 1 / (k + placering), så
+# rankare med helt olika poängskalor (BM25, cosinuslikhet) kan kombineras
+# utan normalisering.
+
+RRF_K = 60
+
+
+def reciprocal_rank_fusion(rankings, k=RRF_K):
+    """rankings: listor med id, bästa först. Returnerar {id: poäng}."""
+    scores = {}
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] = scores.get(item, 0.0) + 1.0 / (k + rank)
+    return scores
+
+
+def max_fusion_score(num_rankings, k=RRF_K):
+    return num_rankings / (k + 1)
@@ -0,0 +1,113 @@
+from collections import Counter
+
+from extraction import PAGE_BREAK
+from lexical_index import LexicalIndex
+from metrics import stage
+
+# === Gemensamt sökindex för docs/ och Bibliotek.docx ===
+# Varje PDF-sida, varje DOCX-fil och varje rubrikavsnitt i Bibliotek.docx är
+# en sökbar enhet med en källa ("pdf", "docx", "bibliotek"). En fråga går
+# genom ett enda BM25-uppslag över enheternas text plus ett över titlarna
+# (filnamn/rubriker), så resultatet blir en kandidatmängd för alla källor.
+# Filtrering på källa och antal träffar per källa (facetter) görs på den
+# färdiga rankningen, utan att söka om.
+#
+# Sidorna i en PDF är korpusens enhetsintervall (corpus_store.py), så texten
+# avkodas bara för de enheter som visas.
+
+SOURCES = ("pdf", "docx", "bibliotek")
+SOURCE_LABELS = {"pdf": "📕 PDF", "docx": "📄 Word", "bibliotek": "📑 Bibliotek"}
+
+# Träff i titeln väger tyngre än i brödtexten (rubriken beskriver avsnittet)
+TITLE_WEIGHT = 2.0
+
+
+class SearchUnit:
+    """En sökbar enhet. item är dokumentposten eller Bibliotek-avsnittet,
+    page sidnumret (från 0) för PDF-sidor, annars None."""
+
+    __slots__ = ("source", "title", "group", "page", "item", "store", "start", "end", "_text")
+
+    def __init__(self, source, title, group, item, page=None, store=None, start=0, end=0, text=None):
+        self.source = source
+        self.title = title
+        self.group = group
+        self.item = item
+        self.page = page
+        self.store = store
+        self.start = start
+        self.end = end
+        self._text = text
+
+    @property
+    def content(self):
+        return self._text if self._text is not None else self.store.decode(self.start, self.end)
+
+    def span(self):
+        return self.start, self.end
+
+    def __getitem__(self, key):
+        try:
+            return getattr(self, key)
+        except AttributeError:
+            raise KeyError(key) from None
+
+
+def document_units(doc, group):
+    """En enhet per sida för PDF (sidorna avgränsas av PAGE_BREAK), en för DOCX."""
+    source = "pdf" if doc["ext"] == ".pdf" else "docx"
+    store = getattr(doc, "store", None)
+    if store is None or getattr(doc, "_text", None) is not None:
+        pages = doc["content"].split(PAGE_BREAK) if source == "pdf" else [doc["content"]]
+        return [SearchUnit(source, doc["filename"], group, doc, page if source == "pdf" else None, text=text)
+                for page, text in enumerate(pages)]
+
+    if source == "docx":
+        start, end = store.span(doc.doc_id)
+        return [SearchUnit(source, doc["filename"], group, doc, None, store, start, end)]
+    return [SearchUnit(source, doc["filename"], group, doc, page, store, int(start), int(end))
+            for page, (start, end) in enumerate(store.unit_spans(doc.doc_id))]
+
+
+class SearchEngine:
+    def __init__(self, documents, word_sections):
+        self.units = []
+        # Första enheten per grupp (dokument eller avsnitt); titeln är gruppens
+        self.group_units = []
+        for doc in documents:
+            self.group_units.append(len(self.units))
+            self.units.extend(document_units(doc, len(self.group_units) - 1))
+        for section in word_sections:
+            self.group_units.append(len(self.units))
+            self.units.append(SearchUnit("bibliotek", section["heading"], len(self.group_units) - 1, section, text=section["text"]))
+
+        self.content_index = LexicalIndex(unit.content for unit in self.units)
+        self.title_index = LexicalIndex(self.units[first].title for first in self.group_units)
+
+    def search(self, query):
+        """Returnerar ([(enhetens index, poäng, titelträff), ...], {källa: antal}).
+
+        Varje dokument/avsnitt förekommer en gång, med sin bäst matchande enhet
+        (index i self.units)."""
+        with stage("candidates"):
+            content_scores = self.content_index.bm25(query)
+            title_scores = self.title_index.bm25(query)
+
+        with stage("scoring"):
+            best = {}
+            for unit_id, score in content_scores.items():
+                group = self.units[unit_id].group
+                if score > best.get(group, (0.0, None))[0]:
+                    best[group] = (score, unit_id)
+            for group in title_scores:
+                best.setdefault(group, (0.0, self.group_units[group]))
+
+            hits = []
+            for group, (score, unit_id) in best.items():
+                title_score = title_scores.get(group, 0.0)
+                hits.append((unit_id, score + TITLE_WEIGHT * title_score, title_score > 0))
+
+        with stage("sort"):
+            hits.sort(key=lambda hit: (hit[1], hit[2]), reverse=True)
+        facets = Counter(self.units[unit_id].source for unit_id, _, _ in hits)
+        return hits, {source: facets.get(source, 0) for source in SOURCES}
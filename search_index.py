@@ -0,0 +1,152 @@
+import os
+import hashlib
+import threading
+from datetime import datetime
+
+import numpy as np
+
+from corpus_store import CorpusWriter, DocumentRecord, remove_stale_generations
+from extraction import extract_many
+from extraction_cache import CACHE_DIR
+
+# === Indexögonblicksbilder ===
+# Allt en sökning läser (dokumentlista, lexikalt och semantiskt index,
+# Word-avsnitt) samlas i en IndexSnapshot som aldrig ändras efter att den
+# byggts. Omindexering bygger en ny bild vid sidan av och byter pekaren i
+# IndexHolder; en sökning läser index.current en gång och ser därmed alltid
+# ett komplett index, gammalt eller nytt.
+
+
+class IndexSnapshot:
+    def __init__(self, documents, lexical_index, semantic_index=None, word_sections=None, search_engine=None):
+        self.version = 0
+        self.documents = documents
+        self.lexical_index = lexical_index
+        self.semantic_index = semantic_index
+        self.word_sections = word_sections if word_sections is not None else []
+        # Gemensamt index över dokument och Bibliotek-avsnitt (search_engine.py)
+        self.search_engine = search_engine
+
+        # Sorteringsordningar beräknas en gång; sortering av träffar blir en gather
+        self.sort_orders = {
+            "filnamn": np.array(sorted(range(len(documents)), key=lambda i: documents[i]["filename"]), dtype=np.intp),
+            "datum": np.array(sorted(range(len(documents)), key=lambda i: -documents[i]["mtime"]), dtype=np.intp),
+        }
+
+    def sort_hits(self, doc_indices, order):
+        """Dokumentindex i förberäknad ordning ("filnamn" eller "datum")."""
+        permutation = self.sort_orders[order]
+        mask = np.zeros(len(self.documents), dtype=bool)
+        mask[list(doc_indices)] = True
+        return permutation[mask[permutation]].tolist()
+
+
+class IndexHolder:
+    def __init__(self, snapshot, on_swap=None):
+        """on_swap(snapshot) anropas efter varje byte (t.ex. för att publicera indexbilden)."""
+        self._lock = threading.Lock()
+        self.on_swap = on_swap
+        snapshot.version = 1
+        self.current = snapshot
+
+    def swap(self, snapshot):
+        with self._lock:
+            snapshot.version = self.current.version + 1
+            self.current = snapshot
+        if self.on_swap is not None:
+            self.on_swap(snapshot)
+        return snapshot
+
+
+class DocumentIndexer:
+    """Håller dokumentposterna för en mapp och extraherar bara om ändrade filer.
+
+    extractors: {".pdf": extraktor, ".docx": extraktor}, se extraction.py.
+    Texten ligger i en memory-mappad korpus (corpus_store.py); posterna
+    innehåller bara metadata.
+    """
+
+    def __init__(self, folder, extractors, extraction_cache=None, corpus_dir=None):
+        self.folder = folder
+        self.extractors = extractors
+        self.extraction_cache = extraction_cache
+        self.corpus_dir = corpus_dir or os.path.join(CACHE_DIR, "corpus")
+        # Egen korpus per mapp och uppsättning extraktorer (appar kan dela cachekatalog)
+        key = os.path.abspath(folder) + "|" + ",".join(sorted(f.__name__ for f in extractors.values()))
+        self.corpus_name = "corpus-" + hashlib.sha1(key.encode("utf-8")).hexdigest()[:12]
+        self.store = None
+        self._docs = {}
+        remove_stale_generations(self.corpus_dir, self.corpus_name)
+
+    def _in_folder(self, path):
+        return os.path.dirname(os.path.abspath(path)) == os.path.abspath(self.folder)
+
+    def _extractor(self, path):
+        return self.extractors.get(os.path.splitext(path)[1].lower())
+
+    def _metadata(self, path):
+        # Filmetadata läses en gång här och förnyas bara vid omindexering, så
+        # sökningar gör aldrig os.stat (dyrt mot en nätverksdisk)
+        filename = os.path.basename(path)
+        stat = os.stat(path)
+        ext = os.path.splitext(filename)[1].lower()
+        return {
+            "filename": filename,
+            "filename_lower": filename.lower(),
+            "path": path,
+            "ext": ext,
+            "icon": "📕" if ext == ".pdf" else "📄",
+            "mtime": stat.st_mtime,
+            "size": stat.st_size,
+            "modified": datetime.fromtimestamp(stat.st_mtime).strftime('%Y-%m-%d'),
+            "size_mb": round(stat.st_size / (1024*1024), 2),
+        }
+
+    def _extract(self, writer, entries, paths, on_document):
+        """Extraherar paths (i processpoolen om den startats, se extraction.start_pool)
+        och skriver texten direkt till den nya generationen."""
+        jobs = [(path, self._extractor(path)) for path in paths if self._extractor(path)]
+        results = extract_many(jobs, self.extraction_cache)
+        for path, content in results:
+            metadata = self._metadata(path)
+            if on_document is not None:
+                on_document(DocumentRecord(text=content, **metadata))
+            entries[path] = (metadata, writer.add(content))
+
+    def _commit(self, writer, entries):
+        store = writer.close()
+        self._docs = {path: DocumentRecord(store, doc_id, **metadata) for path, (metadata, doc_id) in entries.items()}
+        # Bilder som redan byggts mappar den gamla generationen och kan läsa den
+        # även efter att filerna tagits bort
+        if self.store is not None:
+            self.store.remove_files()
+        self.store = store
+        if self.extraction_cache is not None:
+            self.extraction_cache.prune(self.folder, list(self._docs))
+
+    def documents(self):
+        return [self._docs[path] for path in sorted(self._docs)]
+
+    def load(self, on_document=None):
+        """Läser in hela mappen. on_document(doc) anropas för varje dokument så
+        fort dess text är klar (t.ex. för att börja koda embeddings)."""
+        writer = CorpusWriter(self.corpus_dir, self.corpus_name)
+        entries = {}
+        paths = [os.path.join(self.folder, filename) for filename in sorted(os.listdir(self.folder))]
+        self._extract(writer, entries, paths, on_document)
+        self._commit(writer, entries)
+        return self.documents()
+
+    def update(self, changed, removed, on_document=None):
+        # Normalisera sökvägarna så att de matchar nycklarna från load()
+        changed = [os.path.join(self.folder, os.path.basename(p)) for p in changed if self._in_folder(p)]
+        dropped = set(changed) | {os.path.join(self.folder, os.path.basename(p)) for p in removed if self._in_folder(p)}
+        writer = CorpusWriter(self.corpus_dir, self.corpus_name)
+        # Oförändrade dokument kopieras byte för byte från förra generationen
+        entries = {
+            path: (doc.metadata(), writer.copy(doc.store, doc.doc_id))
+            for path, doc in self._docs.items() if path not in dropped
+        }
+        self._extract(writer, entries, changed, on_document)
+        self._commit(writer, entries)
+        return self.documents()
@@ -0,0 +1,217 @@
+import re
+import queue
+import logging
+import threading
+
+import numpy as np
+
+from extraction import PAGE_BREAK
+
+# === Semantiskt index på passage-nivå ===
+# Varje dokument delas i enheter (sidor för PDF, rubrikavsnitt för DOCX)
+# separerade med PAGE_BREAK, och varje enhet i överlappande passager som
+# ryms inom modellens tokengräns. Alla passager ligger i en sammanhängande,
+# L2-normaliserad matris där raderna för ett dokument ligger i följd.
+# Passagetexterna behålls inte: varje passage har sitt byteintervall i
+# korpusen (chunk_span), så den som visas läses direkt ur den mappade texten.
+#
+# När modellen redan är laddad (omindexering) kodar EmbeddingPipeline
+# passagerna i batchar medan extraktionen fortfarande pågår.
+
+logger = logging.getLogger(__name__)
+
+
+WORD_RE = re.compile(r"\S+")
+
+
+def _byte_offsets(text, positions):
+    """Teckenpositioner (stigande) -> byteoffsets i textens UTF-8."""
+    offsets, char, byte = [], 0, 0
+    for pos in positions:
+        byte += len(text[char:pos].encode("utf-8"))
+        char = pos
+        offsets.append(byte)
+    return offsets
+
+
+def split_passages(units, max_words=120, overlap=30):
+    """units: [(enhetstext, byteoffset eller None), ...].
+
+    Returnerar [(enhetsindex, passagetext, start, slut), ...] där start/slut är
+    passagens byteintervall (från första ordets början till sista ordets slut)
+    förskjutet med enhetens offset; -1 om offset saknas."""
+    step = max(max_words - overlap, 1)
+    passages = []
+    for unit_index, (unit, base) in enumerate(units):
+        matches = list(WORD_RE.finditer(unit))
+        if not matches:
+            continue
+        words = [m.group() for m in matches]
+        bounds = [(start, min(start + max_words, len(words)) - 1)
+                  for start in range(0, max(len(words) - overlap, 1), step)]
+        if base is None:
+            spans = [(-1, -1)] * len(bounds)
+        else:
+            positions = sorted({matches[i].start() for i, _ in bounds} | {matches[j].end() for _, j in bounds})
+            offsets = dict(zip(positions, _byte_offsets(unit, positions)))
+            spans = [(base + offsets[matches[i].start()], base + offsets[matches[j].end()]) for i, j in bounds]
+        for (i, j), (start, end) in zip(bounds, spans):
+            passages.append((unit_index, " ".join(words[i:j + 1]), start, end))
+    return passages
+
+
+def document_units(doc):
+    """[(enhetstext, byteoffset i korpusen), ...]; offset None för dokument som
+    bara finns i minnet (t.ex. under extraktionen)."""
+    store = getattr(doc, "store", None)
+    if store is None or getattr(doc, "_text", None) is not None:
+        return [(unit, None) for unit in doc["content"].split(PAGE_BREAK)]
+    return [(store.decode(start, end), int(start)) for start, end in store.unit_spans(doc.doc_id)]
+
+
+def document_passages(doc):
+    # Dokument utan text (t.ex. skannade PDF:er) representeras av filnamnet
+    return split_passages(document_units(doc)) or [(0, doc["filename"], -1, -1)]
+
+
+class EmbeddingPipeline:
+    """Kodar passager i batchar i en egen tråd medan extraktionen pågår.
+
+    add() anropas per dokument när extract_many lämnat dess text; close()
+    väntar in resterande batchar. Resultatet hamnar i embedding_store och
+    plockas upp av SemanticIndex utan ny kodning.
+    """
+
+    def __init__(self, store, encode, batch_size=64):
+        self.store = store
+        self.encode = encode
+        self.batch_size = batch_size
+        self._queue = queue.Queue()
+        self._thread = threading.Thread(target=self._run, name="EmbeddingPipeline", daemon=True)
+        self._thread.start()
+
+    def add(self, doc):
+        self._queue.put([text for _, text, _, _ in document_passages(doc)])
+
+    def _run(self):
+        pending = []
+        while True:
+            texts = self._queue.get()
+            if texts is None:
+                break
+            pending.extend(texts)
+            if len(pending) >= self.batch_size:
+                self._prefetch(pending)
+                pending = []
+        if pending:
+            self._prefetch(pending)
+
+    def _prefetch(self, texts):
+        try:
+            self.store.prefetch(texts, self.encode, self.batch_size)
+        except Exception:
+            # Det som inte hann kodas här kodas av SemanticIndex i stället
+            logger.exception("Förkodning av passager misslyckades")
+
+    def close(self):
+        self._queue.put(None)
+        self._thread.join()
+
+
+class SemanticIndex:
+    """ann: valfritt AnnIndex (ann_index.py). Används när samlingen har minst
+    ann_min_passages passager; annars jämförs frågan mot alla passager."""
+
+    def __init__(self, documents, store, encode, batch_size=64, ann=None, ann_min_passages=0):
+        ids, texts, chunk_doc, chunk_unit, chunk_span = [], [], [], [], []
+        for doc_index, doc in enumerate(documents):
+            for passage_index, (unit_index, text, start, end) in enumerate(document_passages(doc)):
+                ids.append(f"{doc['path']}#{unit_index}:{passage_index}")
+                texts.append(text)
+                chunk_doc.append(doc_index)
+                chunk_unit.append(unit_index)
+                chunk_span.append((start, end))
+
+        self._layout(documents, chunk_doc, chunk_unit, chunk_span)
+        self.matrix = store.sync(ids, texts, encode, batch_size=batch_size)
+
+        self.ann = ann if ann is not None and len(texts) >= max(ann_min_passages, 1) else None
+        if self.ann is not None:
+            # Nyckel = passage-id + textens fingeravtryck, så ändrad text ger ny etikett
+            keys = [f"{i}\0{fp}" for i, fp in zip(ids, store.fingerprints)]
+            labels = self.ann.update(keys, self.matrix)
+            self.row_of_label = np.full(int(labels.max()) + 1, -1, dtype=np.int64)
+            self.row_of_label[labels] = np.arange(len(labels))
+
+    def passage_text(self, passage):
+        """Texten för en passage, avkodad ur korpusen från dess byteintervall."""
+        doc = self.documents[int(self.chunk_doc[passage])]
+        start, end = self.chunk_span[passage]
+        if start < 0:
+            return doc["filename"]
+        return " ".join(doc.store.decode(int(start), int(end)).split())
+
+    def _layout(self, documents, chunk_doc, chunk_unit, chunk_span):
+        self.documents = documents
+        self.chunk_doc = np.asarray(chunk_doc, dtype=np.int32)
+        self.chunk_unit = np.asarray(chunk_unit, dtype=np.int32)
+        self.chunk_span = np.asarray(chunk_span, dtype=np.int64).reshape(-1, 2)
+        self.num_passages = len(self.chunk_doc)
+        # Första passagerad per dokument (varje dokument har minst en passage)
+        self.doc_offsets = np.searchsorted(self.chunk_doc, np.arange(len(documents))).astype(np.intp)
+        self.doc_ends = np.append(self.doc_offsets[1:], self.num_passages)
+
+    @classmethod
+    def from_arrays(cls, documents, matrix, chunk_doc, chunk_unit, chunk_span):
+        """Index från en färdig matris (t.ex. memory-mappad från en annan process), utan ANN."""
+        index = cls.__new__(cls)
+        index._layout(documents, chunk_doc, chunk_unit, chunk_span)
+        index.matrix = matrix
+        index.ann = None
+        return index
+
+    def _ann_search(self, query, top_k, candidates_per_doc=4):
+        """Kandidatpassager från ANN-indexet, grupperade per dokument."""
+        k = max((top_k or 10) * candidates_per_doc, 100)
+        labels, scores = self.ann.search(query, k)
+        known = labels < len(self.row_of_label)
+        rows = np.full(len(labels), -1, dtype=np.int64)
+        rows[known] = self.row_of_label[labels[known]]
+        # Etiketter som tillkommit efter den här bilden (rad -1) hoppas över
+        rows, scores = rows[rows >= 0], scores[rows >= 0]
+        order = np.argsort(-scores, kind="stable")
+        rows, scores = rows[order], scores[order]
+        docs = self.chunk_doc[rows]
+        _, first = np.unique(docs, return_index=True)
+        first = np.sort(first)[:top_k]
+        return [(int(docs[i]), float(scores[i]), int(rows[i])) for i in first]
+
+    def search(self, query_embedding, top_k=None):
+        """Returnerar [(dokumentindex, poäng, passageindex), ...] sorterat på poäng.
+
+        Matrisen är redan normaliserad, så cosinuslikheten för alla passager är
+        en enda matris-vektor-multiplikation.
+        """
+        if not self.num_passages:
+            return []
+        query = np.asarray(query_embedding, dtype=np.float32)
+        query = query / (np.linalg.norm(query) or 1.0)
+
+        if self.ann is not None:
+            return self._ann_search(query, top_k)
+
+        scores = self.matrix @ query
+        doc_scores = np.maximum.reduceat(scores, self.doc_offsets)
+
+        if top_k is not None and top_k < len(doc_scores):
+            top = np.argpartition(-doc_scores, top_k - 1)[:top_k]
+        else:
+            top = np.arange(len(doc_scores))
+        top = top[np.argsort(-doc_scores[top], kind="stable")]
+
+        results = []
+        for doc_index in top:
+            start, end = self.doc_offsets[doc_index], self.doc_ends[doc_index]
+            best = int(start + np.argmax(scores[start:end]))
+            results.append((int(doc_index), float(doc_scores[doc_index]), best))
+        return results
@@ -0,0 +1,230 @@
+"""Flera sökprocesser bakom en gemensam front, med ett delat index.
+
+    python serve.py --workers 4 --port 7860
+
+Startar en indexerare och N arbetare som alla kör app5.1.py:
+
+* Indexeraren extraherar docs/, laddar modellen, bygger indexet och
+  publicerar varje ny indexbild som en generation (shared_index.py). Den
+  bevakar docs/ precis som den fristående appen, och kodar sökfrågor åt
+  arbetarna (embedding_backend.EncoderServer).
+* Arbetarna läser den senaste generationen skrivskyddat (korpus och
+  embeddings memory-mappas och delas via sidcachen) och byter generation
+  utan omstart när indexeraren publicerar en ny.
+* Fronten tar emot alla anrop och skickar dem vidare till en arbetare.
+  Gradio håller sessionens tillstånd (markör, sökhistorik) i processen, så
+  en webbläsare stannar hos samma arbetare via en cookie.
+
+Processer som avslutas startas om. /halsa och /halsa/redo på fronten visar
+arbetarnas status och om indexeraren kan koda frågor.
+"""
+import os
+import sys
+import asyncio
+import signal
+import socket
+import secrets
+import argparse
+import itertools
+import threading
+import subprocess
+
+import httpx
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+from starlette.background import BackgroundTask
+
+from embedding_backend import open_encoder_connection
+from metrics import LOCAL_ONLY_PATHS, is_local_client
+
+ROOT = os.path.dirname(os.path.abspath(__file__))
+APP = "app5.1.py"
+WORKER_COOKIE = "noguide_arbetare"
+RESTART_DELAY = 2.0
+PROBE_TIMEOUT = 2.0
+
+# Huvuden som gäller en enskild anslutning och inte ska skickas vidare
+HOP_BY_HOP = frozenset({
+    "connection", "keep-alive", "proxy-authenticate", "proxy-authorization",
+    "te", "trailer", "trailers", "transfer-encoding", "upgrade",
+})
+
+
+def free_port():
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+# === Processer ===
+
+class ManagedProcess:
+    """En barnprocess som startas om om den avslutas."""
+
+    def __init__(self, name, env):
+        self.name = name
+        self.env = env
+        self.proc = None
+        self.restarts = 0
+
+    def start(self):
+        self.proc = subprocess.Popen([sys.executable, APP], cwd=ROOT, env=self.env)
+
+    @property
+    def alive(self):
+        return self.proc is not None and self.proc.poll() is None
+
+    def check(self):
+        if self.proc is not None and not self.alive:
+            print(f"⚠️ {self.name} avslutades (kod {self.proc.returncode}), startar om", file=sys.stderr)
+            self.restarts += 1
+            self.start()
+
+    def stop(self):
+        if self.alive:
+            self.proc.terminate()
+            try:
+                self.proc.wait(timeout=10)
+            except subprocess.TimeoutExpired:
+                self.proc.kill()
+
+
+class Worker(ManagedProcess):
+    def __init__(self, index, port, env):
+        super().__init__(f"arbetare {index}", dict(env, NOGUIDE_ROLE="worker", PORT=str(port)))
+        self.index = index
+        self.url = f"http://127.0.0.1:{port}"
+
+
+def supervise(processes, stopped):
+    while not stopped.wait(RESTART_DELAY):
+        for process in processes:
+            process.check()
+
+
+# === Fronten ===
+
+def encoder_status(address, authkey):
+    """Om indexerarens EncoderServer svarar (arbetarna söker annars på nyckelord)."""
+    try:
+        conn, (model_id, backend) = open_encoder_connection(address, authkey, PROBE_TIMEOUT)
+    except (OSError, EOFError) as e:
+        return {"reachable": False, "error": f"{type(e).__name__}: {e}"}
+    conn.close()
+    return {"reachable": True, "model": model_id, "backend": backend}
+
+
+def create_frontend(workers, indexer, probe_encoder):
+    app = FastAPI()
+    client = httpx.AsyncClient(timeout=None)
+    next_worker = itertools.cycle(workers)
+
+    def pick(request):
+        sticky = request.cookies.get(WORKER_COOKIE)
+        if sticky is not None and sticky.isdigit() and int(sticky) < len(workers):
+            worker = workers[int(sticky)]
+            if worker.alive:
+                return worker, False
+        # Ny session (eller arbetaren är nere): nästa levande arbetare i tur
+        for _ in range(len(workers)):
+            worker = next(next_worker)
+            if worker.alive:
+                return worker, True
+        return None, False
+
+    async def worker_status(worker):
+        try:
+            response = await client.get(worker.url + "/halsa", timeout=2.0)
+            return dict(response.json(), worker=worker.index, alive=True, restarts=worker.restarts)
+        except (httpx.HTTPError, ValueError):
+            return {"worker": worker.index, "alive": worker.alive, "ready": False, "restarts": worker.restarts}
+
+    @app.get("/halsa")
+    async def health():
+        statuses = [await worker_status(worker) for worker in workers]
+        indexer_status = {
+            "alive": indexer.alive,
+            "restarts": indexer.restarts,
+            "encoder": await asyncio.to_thread(probe_encoder),
+        }
+        return {"ready": any(status["ready"] for status in statuses), "indexer": indexer_status, "workers": statuses}
+
+    @app.get("/halsa/redo")
+    async def readiness():
+        current = await health()
+        return JSONResponse(current, status_code=200 if current["ready"] else 503)
+
+    @app.api_route("/{path:path}", methods=["GET", "POST", "PUT", "PATCH", "DELETE", "HEAD", "OPTIONS"])
+    async def proxy(request: Request, path: str):
+        # Arbetarna ser fronten som klient (127.0.0.1): kontrollera här
+        if request.url.path in LOCAL_ONLY_PATHS and not is_local_client(request.client.host if request.client else None):
+            return JSONResponse({"detail": "Endast lokala anrop"}, status_code=403)
+        worker, assigned = pick(request)
+        if worker is None:
+            return JSONResponse({"detail": "Ingen arbetare är igång"}, status_code=503)
+
+        # Host följer med så att Gradio bygger sina URL:er mot fronten
+        headers = [(k, v) for k, v in request.headers.raw if k.decode("latin-1").lower() not in HOP_BY_HOP]
+        upstream = client.build_request(
+            request.method, worker.url + request.url.path,
+            params=request.url.query, headers=headers, content=request.stream(),
+        )
+        try:
+            response = await client.send(upstream, stream=True)
+        except httpx.HTTPError:
+            return JSONResponse({"detail": f"{worker.name} svarar inte"}, status_code=502)
+
+        # Svaret strömmas (Gradios SSE-händelser, nedladdningar) utan att buffras
+        result = StreamingResponse(
+            response.aiter_raw(),
+            status_code=response.status_code,
+            headers={k: v for k, v in response.headers.items() if k.lower() not in HOP_BY_HOP and k.lower() != "set-cookie"},
+            background=BackgroundTask(response.aclose),
+        )
+        for cookie in response.headers.get_list("set-cookie"):
+            result.raw_headers.append((b"set-cookie", cookie.encode("latin-1")))
+        if assigned:
+            result.set_cookie(WORKER_COOKIE, str(worker.index), httponly=True, samesite="lax")
+        return result
+
+    return app
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--workers", type=int, default=max((os.cpu_count() or 2) - 1, 1))
+    parser.add_argument("--host", default="0.0.0.0")
+    parser.add_argument("--port", type=int, default=int(os.environ.get("PORT", 7860)))
+    args = parser.parse_args()
+
+    # Nyckeln skyddar frågekodningen på den lokala porten mot andra processer
+    encoder_address = ("127.0.0.1", free_port())
+    encoder_key = secrets.token_hex(16)
+    env = dict(
+        os.environ,
+        NOGUIDE_ENCODER_ADDRESS="%s:%d" % encoder_address,
+        NOGUIDE_ENCODER_KEY=encoder_key,
+    )
+    indexer = ManagedProcess("indexerare", dict(env, NOGUIDE_ROLE="indexer"))
+    workers = [Worker(i, free_port(), env) for i in range(args.workers)]
+    processes = [indexer] + workers
+    for process in processes:
+        process.start()
+
+    stopped = threading.Event()
+    threading.Thread(target=supervise, args=(processes, stopped), name="Supervisor", daemon=True).start()
+    # uvicorn skickar vidare SIGTERM efter nedstängningen; utan egen hanterare
+    # dör processen direkt och barnprocesserna blir kvar
+    signal.signal(signal.SIGTERM, lambda *_: sys.exit(0))
+    try:
+        probe_encoder = lambda: encoder_status(encoder_address, bytes.fromhex(encoder_key))
+        uvicorn.run(create_frontend(workers, indexer, probe_encoder), host=args.host, port=args.port)
+    finally:
+        stopped.set()
+        for process in processes:
+            process.stop()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,161 @@
+import os
+import json
+import time
+import shutil
+import pickle
+import logging
+import threading
+
+import numpy as np
+
+from corpus_store import CorpusStore, DocumentRecord
+from extraction_cache import CACHE_DIR
+from search_index import IndexSnapshot
+from semantic_index import SemanticIndex
+
+# === Delat, skrivskyddat index för flera sökprocesser (serve.py) ===
+# En indexerare bygger indexet och publicerar varje ny indexbild som en
+# generation: en katalog med korpusen (hårdlänkad, memory-mappas), dokument-
+# metadata, det lexikala indexet och embedding-matrisen (.npy, memory-mappas).
+# Filen CURRENT pekar på den senaste generationen och byts atomärt
+# (os.replace). Sökprocesserna (arbetarna) bevakar pekaren och byter till en
+# ny generation utan omstart; texten och matrisen delas via sidcachen.
+#
+# NOGUIDE_ROLE: "indexer", "worker" eller tomt (fristående, allt i en process).
+
+SERVE_ROLE = os.environ.get("NOGUIDE_ROLE", "")
+GENERATIONS_DIR = os.environ.get("NOGUIDE_GENERATIONS_DIR", os.path.join(CACHE_DIR, "generationer"))
+ENCODER_ADDRESS = os.environ.get("NOGUIDE_ENCODER_ADDRESS", "127.0.0.1:7870")
+# Krävs för indexerare och arbetare (serve.py sätter en slumpad nyckel per start)
+ENCODER_KEY = os.environ.get("NOGUIDE_ENCODER_KEY", "")
+POINTER = "CURRENT"
+KEEP_GENERATIONS = 3
+
+logger = logging.getLogger(__name__)
+
+
+def encoder_address():
+    host, port = ENCODER_ADDRESS.rsplit(":", 1)
+    return host, int(port)
+
+
+def _link_or_copy(source, target):
+    try:
+        os.link(source, target)
+    except OSError:
+        shutil.copyfile(source, target)
+
+
+def publish_snapshot(snapshot, directory=GENERATIONS_DIR):
+    """Skriver indexbilden som en ny generation och pekar CURRENT på den."""
+    os.makedirs(directory, exist_ok=True)
+    # Namnen sorteras i publiceringsordning (se _prune)
+    name = f"gen-{time.time_ns():020d}-{os.getpid()}"
+    tmp = os.path.join(directory, name + ".tmp")
+    os.makedirs(tmp)
+
+    documents = snapshot.documents
+    store = documents[0].store if documents else None
+    if store is not None:
+        for suffix in CorpusStore.SUFFIXES:
+            _link_or_copy(store.base + suffix, os.path.join(tmp, "corpus" + suffix))
+    with open(os.path.join(tmp, "documents.json"), "w", encoding="utf-8") as f:
+        json.dump([dict(doc.metadata(), doc_id=doc.doc_id) for doc in documents], f, ensure_ascii=False)
+    with open(os.path.join(tmp, "lexical.pickle"), "wb") as f:
+        pickle.dump(snapshot.lexical_index, f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    semantic = snapshot.semantic_index
+    if semantic is not None:
+        np.save(os.path.join(tmp, "matrix.npy"), np.asarray(semantic.matrix, dtype=np.float32))
+        np.save(os.path.join(tmp, "chunk_doc.npy"), semantic.chunk_doc)
+        np.save(os.path.join(tmp, "chunk_unit.npy"), semantic.chunk_unit)
+        np.save(os.path.join(tmp, "chunk_span.npy"), semantic.chunk_span)
+
+    os.rename(tmp, os.path.join(directory, name))
+    pointer = os.path.join(directory, POINTER)
+    with open(pointer + ".tmp", "w", encoding="utf-8") as f:
+        f.write(name)
+    os.replace(pointer + ".tmp", pointer)
+    _prune(directory, name)
+    return name
+
+
+def publish_latest(snapshot):
+    """IndexHolder.on_swap i indexeraren. Ett fel loggas; arbetarna behåller
+    då förra generationen tills nästa omindexering."""
+    try:
+        publish_snapshot(snapshot)
+    except Exception:
+        logger.exception("Kunde inte publicera generation")
+
+
+def _prune(directory, current):
+    # De senaste generationerna behålls så att en arbetare som just läst
+    # pekaren hinner öppna filerna; redan mappade filer klarar att tas bort
+    names = sorted(n for n in os.listdir(directory) if n.startswith("gen-") and n != current)
+    for name in names[:max(len(names) - (KEEP_GENERATIONS - 1), 0)]:
+        shutil.rmtree(os.path.join(directory, name), ignore_errors=True)
+
+
+def current_generation(directory=GENERATIONS_DIR):
+    try:
+        with open(os.path.join(directory, POINTER), encoding="utf-8") as f:
+            return f.read().strip() or None
+    except OSError:
+        return None
+
+
+def load_snapshot(path):
+    """Öppnar en generation skrivskyddat; korpus och matris memory-mappas."""
+    with open(os.path.join(path, "documents.json"), encoding="utf-8") as f:
+        entries = json.load(f)
+    store = CorpusStore(os.path.join(path, "corpus")) if entries else None
+    documents = [DocumentRecord(store, entry.pop("doc_id"), **entry) for entry in entries]
+    with open(os.path.join(path, "lexical.pickle"), "rb") as f:
+        lexical_index = pickle.load(f)
+
+    semantic_index = None
+    if os.path.exists(os.path.join(path, "matrix.npy")):
+        semantic_index = SemanticIndex.from_arrays(
+            documents,
+            np.load(os.path.join(path, "matrix.npy"), mmap_mode="r"),
+            np.load(os.path.join(path, "chunk_doc.npy")),
+            np.load(os.path.join(path, "chunk_unit.npy")),
+            np.load(os.path.join(path, "chunk_span.npy")),
+        )
+    return IndexSnapshot(documents, lexical_index, semantic_index)
+
+
+class GenerationFollower:
+    """Bevakar CURRENT och anropar on_snapshot(indexbild) för varje ny generation."""
+
+    def __init__(self, on_snapshot, directory=GENERATIONS_DIR, interval=1.0):
+        self.on_snapshot = on_snapshot
+        self.directory = directory
+        self.interval = interval
+        self.generation = None
+        self._loaded = threading.Event()
+        self._thread = threading.Thread(target=self._run, name="GenerationFollower", daemon=True)
+
+    def attach(self):
+        """Startar bevakningen och väntar tills den första generationen är inläst."""
+        self._thread.start()
+        self._loaded.wait()
+
+    def poll(self):
+        name = current_generation(self.directory)
+        if name is None or name == self.generation:
+            return False
+        self.on_snapshot(load_snapshot(os.path.join(self.directory, name)))
+        self.generation = name
+        self._loaded.set()
+        return True
+
+    def _run(self):
+        while True:
+            try:
+                self.poll()
+            except Exception:
+                # T.ex. en generation som rensats mellan pekaren och öppningen: nästa varv försöker igen
+                logger.exception("Kunde inte läsa generation")
+            time.sleep(self.interval)
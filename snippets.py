@@ -0,0 +1,192 @@
+import re
+import html
+from bisect import bisect_left, bisect_right
+from collections import Counter
+
+from lexical_index import SWEDISH_STOPWORDS, swedish_stem, tokenize
+from query_cache import QueryCache, normalize_query
+
+# === Träffutdrag ===
+# Alla sökord (hela frasen, varje ord och dess stam samt stavfelsexpansioner
+# från det lexikala indexet) slås ihop till ett enda kompilerat reguljärt
+# uttryck per fråga. Dokumenttexten gås igenom en gång; utdraget blir det fönster som
+# täcker flest olika sökord, och markeringen görs i samma vända. Bara
+# fönstret normaliseras (radbrytningar -> mellanslag) – aldrig hela texten.
+# För dokument i korpusen (corpus_store.py) söker snippet_for direkt i den
+# memory-mappade gemena texten och avkodar bara fönstret som visas.
+
+MAX_MATCHES = 1000
+# Kortare termer (t.ex. "e" i "e-handel") tas bara med om inget längre sökord
+# finns, och matchas då bara som hela ord
+MIN_TERM_CHARS = 3
+WHITESPACE = str.maketrans("\n\r\f\t", "    ")
+
+_matchers = QueryCache("snippet_matchers", maxsize=512)
+
+
+def _alternative(term):
+    if len(term) < MIN_TERM_CHARS:
+        return rf"\b{re.escape(term)}\b"
+    return re.escape(term)
+
+
+def _byte_alternative(term):
+    # \b i byte-uttryck känner bara till ASCII; byte över 0x7f hör till ord (å, ä, ö)
+    escaped = re.escape(term.encode("utf-8"))
+    if len(term) < MIN_TERM_CHARS:
+        return rb"(?<![\w\x80-\xff])" + escaped + rb"(?![\w\x80-\xff])"
+    return escaped
+
+
+class SnippetMatcher:
+    def __init__(self, groups):
+        """groups: {termer: index för de sökord termen räknas som träff på}."""
+        self.groups = {term.lower(): frozenset(ids) for term, ids in groups.items()}
+        alternatives = sorted(self.groups, key=len, reverse=True)
+        self.pattern = re.compile("|".join(map(_alternative, alternatives)), re.IGNORECASE) if alternatives else None
+        # Samma termer som byte för sökning direkt i korpusens gemena text
+        self.byte_groups = {term.encode("utf-8"): ids for term, ids in self.groups.items()}
+        self.byte_pattern = re.compile(b"|".join(_byte_alternative(term) for term in alternatives)) if alternatives else None
+
+    def _groups(self, matched):
+        return self.groups.get(matched.lower(), frozenset())
+
+    def _render(self, piece, start, end, matches):
+        """piece(a, b) -> texten mellan positionerna a och b."""
+        parts = []
+        pos = start
+        for match_start, match_end, _ in matches:
+            parts.append(html.escape(piece(pos, match_start).translate(WHITESPACE)))
+            parts.append(f"<mark>{html.escape(piece(match_start, match_end).translate(WHITESPACE))}</mark>")
+            pos = match_end
+        parts.append(html.escape(piece(pos, end).translate(WHITESPACE)))
+        return "".join(parts)
+
+    def highlight(self, text):
+        """Hela texten HTML-escapad med alla träffar markerade (t.ex. filnamn)."""
+        if self.pattern is None:
+            return html.escape(text)
+        matches = [(m.start(), m.end(), None) for m in self.pattern.finditer(text)]
+        return self._render(lambda a, b: text[a:b], 0, len(text), matches)
+
+    @staticmethod
+    def _window(matches, max_chars, lower, upper):
+        """Tätaste fönstret: flest olika sökord, därefter flest träffar.
+
+        Returnerar (start, slut, träffar i fönstret) inom [lower, upper)."""
+        best = None
+        counts = Counter()
+        left = 0
+        for right, (_, match_end, groups) in enumerate(matches):
+            counts.update(groups)
+            while left < right and match_end - matches[left][0] > max_chars:
+                counts.subtract(matches[left][2])
+                left += 1
+            score = (sum(1 for c in counts.values() if c > 0), right - left + 1)
+            if best is None or score > best[0]:
+                best = (score, left, right)
+
+        _, left, right = best
+        span_start, span_end = matches[left][0], matches[right][1]
+        pad = max(max_chars - (span_end - span_start), 0) // 2
+        return max(span_start - pad, lower), min(span_end + pad, upper)
+
+    @staticmethod
+    def _in_window(matches, start, end):
+        # Träffar i marginalerna runt fönstret markeras också
+        starts = [m[0] for m in matches]
+        first = bisect_left(starts, start)
+        last = bisect_right(starts, end)
+        return [m for m in matches[first:last] if m[1] <= end]
+
+    def _matches(self, pattern, groups, *args):
+        matches = []
+        for m in pattern.finditer(*args):
+            matches.append((m.start(), m.end(), groups(m.group(0))))
+            if len(matches) >= MAX_MATCHES:
+                break
+        return matches
+
+    def snippet(self, text, max_chars=600):
+        if self.pattern is None:
+            return None
+        matches = self._matches(self.pattern, self._groups, text)
+        if not matches:
+            return None
+
+        start, end = self._window(matches, max_chars, 0, len(text))
+        snippet = self._render(lambda a, b: text[a:b], start, end, self._in_window(matches, start, end))
+        if start > 0:
+            snippet = "…" + snippet
+        if end < len(text):
+            snippet += "…"
+        return snippet.strip()
+
+    def snippet_for(self, doc, max_chars=600):
+        """Utdrag för ett dokument i korpusen (corpus_store.py) utan att avkoda
+        hela texten: sökningen görs i den gemena byteversionen och bara
+        fönstret avkodas. Fönstret mäts i byte (å/ä/ö räknas dubbelt).
+        doc.span() ger byteintervallet (ett dokument eller t.ex. en sida)."""
+        store = getattr(doc, "store", None)
+        if store is None or getattr(doc, "_text", None) is not None:
+            return self.snippet(doc["content"], max_chars)
+        if self.byte_pattern is None:
+            return None
+        lower, upper = doc.span()
+        empty = frozenset()
+        matches = self._matches(self.byte_pattern, lambda m: self.byte_groups.get(m, empty), store.normalized, lower, upper)
+        if not matches:
+            return None
+
+        start, end = self._window(matches, max_chars, lower, upper)
+        # Fönstrets kanter får inte hamna mitt i ett tecken
+        start = store.char_boundary(start, lower)
+        if end < upper:
+            end = store.char_boundary(end, start)
+        snippet = self._render(store.decode, start, end, self._in_window(matches, start, end))
+        if start > lower:
+            snippet = "…" + snippet
+        if end < upper:
+            snippet += "…"
+        return snippet.strip()
+
+
+def build_matcher(query, expand=None):
+    """expand(stam) -> termer, t.ex. LexicalIndex.expand_term för stavfel."""
+    tokens = tokenize(query)
+    content = [t for t in tokens if t not in SWEDISH_STOPWORDS] or tokens
+    stems = [swedish_stem(t) for t in content]
+
+    # Både ordet som det skrevs och dess stam: "lager" markeras helt i
+    # "lagerkontoret", stammen "lag" fångar övriga böjningsformer
+    groups = {}
+    for i, (token, stem) in enumerate(zip(content, stems)):
+        groups.setdefault(token, set()).add(i)
+        groups.setdefault(stem, set()).add(i)
+        if expand is not None:
+            # Böjningsformer och delord innehåller stammen och täcks redan av den
+            for term in expand(stem):
+                if stem not in term:
+                    groups.setdefault(term, set()).add(i)
+
+    phrase = " ".join(query.lower().split())
+    if phrase:
+        groups.setdefault(phrase, set()).update(range(max(len(stems), 1)))
+    if any(len(term) >= MIN_TERM_CHARS for term in groups):
+        groups = {term: ids for term, ids in groups.items() if len(term) >= MIN_TERM_CHARS}
+    return SnippetMatcher(groups)
+
+
+def snippet_matcher(query, snapshot=None):
+    """Cachad matchare per fråga; med snapshot ingår stavfelsexpansioner
+    från dess lexikala index (nyckeln innehåller indexversionen)."""
+    version = snapshot.version if snapshot is not None else None
+    expand = snapshot.lexical_index.expand_term if snapshot is not None else None
+    return _matchers.get_or_compute(
+        (version, normalize_query(query)),
+        lambda: build_matcher(query, expand),
+    )
+
+
+def extract_context_snippet(text, query, max_chars=600, snapshot=None):
+    return snippet_matcher(query, snapshot).snippet(text, max_chars)
@@ -0,0 +1,72 @@
+import numpy as np
+import pytest
+
+import ann_index
+from ann_index import IvfIndex, open_ann_index
+from semantic_index import SemanticIndex
+
+
+def normalized(rng, n, dim=16):
+    vectors = rng.standard_normal((n, dim)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def test_ivf_recall_against_exact_search(tmp_path):
+    rng = np.random.default_rng(1)
+    matrix = normalized(rng, 2000)
+    index = IvfIndex(str(tmp_path), 16, "modell", nprobe=16)
+    labels = index.update([f"p{i}" for i in range(len(matrix))], matrix)
+
+    k, found = 10, 0
+    for query in normalized(rng, 20):
+        exact = set(labels[np.argsort(-(matrix @ query))[:k]].tolist())
+        approx, _ = index.search(query, k)
+        found += len(exact & set(approx.tolist()))
+    assert found / (20 * k) >= 0.9
+
+
+def test_ivf_update_keeps_labels_and_drops_removed_keys(tmp_path):
+    rng = np.random.default_rng(2)
+    matrix = normalized(rng, 300)
+    keys = [f"p{i}" for i in range(len(matrix))]
+    index = IvfIndex(str(tmp_path), 16, "modell")
+    labels = index.update(keys, matrix)
+
+    reopened = IvfIndex(str(tmp_path), 16, "modell")
+    assert reopened.update(keys[:-1], matrix[:-1]).tolist() == labels[:-1].tolist()
+    found, _ = reopened.search(matrix[-1], 300)
+    assert labels[-1] not in found
+
+
+def test_hnsw_without_hnswlib_is_an_import_error(monkeypatch, tmp_path):
+    monkeypatch.setattr(ann_index, "hnswlib", None)
+
+    with pytest.raises(ImportError):
+        open_ann_index("modell", 16, "hnsw", directory=str(tmp_path))
+    assert open_ann_index("modell", 16, "auto", directory=str(tmp_path)).backend == "ivf"
+
+
+class EmbeddingStub:
+    """Minimal embedding_store: vektorerna finns redan, inget kodas."""
+
+    def __init__(self, vectors):
+        self.vectors = vectors
+        self.fingerprints = []
+
+    def sync(self, ids, texts, encode, batch_size=32):
+        self.fingerprints = list(texts)
+        return self.vectors[:len(texts)]
+
+
+def test_small_collection_falls_back_to_brute_force(tmp_path):
+    rng = np.random.default_rng(3)
+    documents = [{"filename": f"{i}.pdf", "path": f"docs/{i}.pdf", "content": f"dokument {i}"} for i in range(5)]
+    vectors = normalized(rng, 5)
+    ann = IvfIndex(str(tmp_path), 16, "modell")
+
+    index = SemanticIndex(documents, EmbeddingStub(vectors), encode=None, ann=ann, ann_min_passages=100)
+
+    assert index.ann is None
+    hits = index.search(vectors[3], top_k=1)
+    assert hits[0][0] == 3 and hits[0][2] == 3
+    assert len(ann) == 0
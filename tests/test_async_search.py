@@ -0,0 +1,75 @@
+import asyncio
+import threading
+
+from async_search import SUPERSEDED, SearchDebouncer
+
+
+def test_newer_query_supersedes_one_still_waiting():
+    debouncer = SearchDebouncer(delay=0.05)
+    calls = []
+
+    async def main():
+        first = asyncio.create_task(debouncer.run("session", calls.append, "lag"))
+        await asyncio.sleep(0.01)
+        second = asyncio.create_task(debouncer.run("session", calls.append, "lager"))
+        return await first, await second
+
+    first, _ = asyncio.run(main())
+
+    assert first is SUPERSEDED
+    assert calls == ["lager"]
+
+
+def test_result_computed_after_a_newer_query_arrived_is_dropped():
+    debouncer = SearchDebouncer(delay=0)
+    started, release = threading.Event(), threading.Event()
+
+    def slow(query):
+        started.set()
+        release.wait(2)
+        return query
+
+    async def main():
+        first = asyncio.create_task(debouncer.run("session", slow, "lag"))
+        await asyncio.to_thread(started.wait, 2)
+        second = asyncio.create_task(debouncer.run("session", str.upper, "lager"))
+        await asyncio.sleep(0.01)
+        release.set()
+        return await first, await second
+
+    assert asyncio.run(main()) == (SUPERSEDED, "LAGER")
+
+
+def test_sessions_do_not_supersede_each_other():
+    debouncer = SearchDebouncer(delay=0.01)
+
+    async def main():
+        return await asyncio.gather(
+            debouncer.run("a", str.upper, "lager"),
+            debouncer.run("b", str.upper, "pall"),
+        )
+
+    assert asyncio.run(main()) == ["LAGER", "PALL"]
+
+
+def test_stream_stops_when_superseded():
+    debouncer = SearchDebouncer(delay=0)
+    closed = threading.Event()
+
+    def steps(query):
+        try:
+            yield "nyckelord"
+            yield "hybrid"
+        finally:
+            closed.set()
+
+    async def main():
+        received = []
+        async for result in debouncer.stream("session", steps, "lager"):
+            received.append(result)
+            if result == "nyckelord":
+                await debouncer.run("session", str.upper, "lagerplats")
+        return received
+
+    assert asyncio.run(main()) == ["nyckelord", SUPERSEDED]
+    assert closed.is_set()
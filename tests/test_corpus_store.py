@@ -0,0 +1,49 @@
+from corpus_store import CorpusWriter, DocumentRecord, normalize_text
+from extraction import PAGE_BREAK
+
+
+def write_corpus(tmp_path, texts):
+    writer = CorpusWriter(str(tmp_path), "korpus")
+    doc_ids = [writer.add(text) for text in texts]
+    return writer.close(), doc_ids
+
+
+def test_spans_are_byte_offsets_into_the_text(tmp_path):
+    texts = ["Första", "Åtgärd för lagerplats", ""]
+    store, doc_ids = write_corpus(tmp_path, texts)
+
+    for doc_id, text in zip(doc_ids, texts):
+        start, end = store.span(doc_id)
+        assert end - start == len(text.encode("utf-8"))
+        assert store.text_of(doc_id) == text
+
+
+def test_unit_spans_split_on_page_break(tmp_path):
+    pages = ["Sida ett", "Sidan två – Översikt", "", "Sista"]
+    store, (doc_id,) = write_corpus(tmp_path, [PAGE_BREAK.join(pages)])
+
+    assert [store.decode(start, end) for start, end in store.unit_spans(doc_id)] == pages
+    doc = DocumentRecord(store, doc_id, **dict.fromkeys(DocumentRecord.METADATA))
+    assert [doc.unit_text(i) for i in range(len(pages))] == pages
+
+
+def test_normalized_copy_has_the_same_offsets(tmp_path):
+    text = "ÅSA\tÖverlämning\nLAGER" + PAGE_BREAK + "Straße"
+    store, (_, doc_id) = write_corpus(tmp_path, ["prefix", text])
+
+    start, end = store.span(doc_id)
+    assert len(store.normalized) == len(store.text)
+    assert store.normalized[start:end].decode("utf-8") == normalize_text(text)
+
+
+def test_copy_round_trips_text_normalized_copy_and_units(tmp_path):
+    text = "Rubrik\nÄndrad text" + PAGE_BREAK + "Andra avsnittet"
+    old, (_, old_id) = write_corpus(tmp_path, ["annat dokument", text])
+
+    writer = CorpusWriter(str(tmp_path), "korpus")
+    new_id = writer.copy(old, old_id)
+    new = writer.close()
+
+    assert new.text_of(new_id) == text
+    assert new.normalized[slice(*new.span(new_id))] == old.normalized[slice(*old.span(old_id))]
+    assert [new.decode(start, end) for start, end in new.unit_spans(new_id)] == text.split(PAGE_BREAK)
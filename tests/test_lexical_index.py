@@ -0,0 +1,49 @@
+from lexical_index import LexicalIndex, query_terms
+
+TEXTS = [
+    "Inventering av lagerplatser i centrallagret",
+    "Lagerplats för helpall och halvpall",
+    "Rutin för returer och reklamationer",
+    "Inventering inventering inventering av hyllor",
+]
+
+
+def test_bm25_scores_only_matching_documents_and_rewards_term_frequency():
+    index = LexicalIndex(TEXTS)
+    scores = index.bm25("inventering")
+
+    assert set(scores) == {0, 3}
+    assert scores[3] > scores[0] > 0
+
+
+def test_stopwords_are_dropped_unless_the_query_has_nothing_else():
+    assert query_terms("rutin för returer") == ["ruti", "retur"]
+    assert query_terms("för") == ["för"]
+
+
+def test_prefix_expansion_covers_inflected_forms():
+    index = LexicalIndex(TEXTS)
+
+    assert {"lagerplatser", "lagerplats"} <= index.expand_term("lagerplats")
+    assert index.match("lagerplatser")[0] == {0, 1}
+
+
+def test_compound_parts_are_found_through_trigrams():
+    index = LexicalIndex(TEXTS)
+
+    assert index.expand_term("pall") >= {"helpall", "halvpall"}
+    assert index.match("pall")[0] == {1}
+
+
+def test_misspelling_is_matched_only_when_nothing_else_does():
+    index = LexicalIndex(TEXTS)
+
+    assert "reklamationer" in index.expand_term("reklamatoner")
+    assert index.bm25("reklamatoner").keys() == {2}
+
+
+def test_subword_matches_weigh_less_than_prefix_matches():
+    index = LexicalIndex(["pall", "helpall"])
+    scores = index.bm25("pall")
+
+    assert scores[0] > scores[1] > 0
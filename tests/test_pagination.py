@@ -0,0 +1,62 @@
+from pagination import ResultCursor
+from query_cache import QueryCache
+from search_index import IndexHolder, IndexSnapshot
+
+
+def make_snapshot(filenames):
+    documents = [{"filename": name, "mtime": i} for i, name in enumerate(filenames)]
+    return IndexSnapshot(documents, lexical_index=None)
+
+
+def render_page(snapshot, query, results):
+    return "".join(f"<h4>{snapshot.documents[doc_index]['filename']}</h4>" for doc_index, _ in results)
+
+
+def test_pages_render_only_the_next_results():
+    index = IndexHolder(make_snapshot([f"{i}.pdf" for i in range(7)]))
+    cursor = ResultCursor(index, index.current, "lager", [(i, 1.0) for i in range(7)])
+
+    assert cursor.next_page(render_page, page_size=5) is cursor
+    assert cursor.html.count("<h4>") == 5 and cursor.has_more
+    cursor.next_page(render_page, page_size=5)
+    assert cursor.html.count("<h4>") == 7 and not cursor.has_more
+
+
+def test_stale_cursor_is_dropped_after_reindexing():
+    index = IndexHolder(make_snapshot(["a.pdf", "b.pdf"]))
+    cursor = ResultCursor(index, index.current, "lager", [(0, 1.0), (1, 0.5)])
+    cursor.next_page(render_page, page_size=1)
+
+    index.swap(make_snapshot(["c.pdf"]))
+
+    assert cursor.next_page(render_page, page_size=1) is None
+    assert cursor.html == "<h4>a.pdf</h4>"
+
+
+def test_iter_page_stops_at_a_stale_snapshot():
+    index = IndexHolder(make_snapshot(["a.pdf", "b.pdf", "c.pdf"]))
+    cursor = ResultCursor(index, index.current, "lager", [(0, 1.0), (1, 0.5), (2, 0.2)])
+    pages = cursor.iter_page(render_page, page_size=3)
+
+    next(pages)
+    index.swap(make_snapshot(["d.pdf"]))
+
+    assert list(pages) == []
+    assert cursor.shown == 1
+
+
+def test_rendered_pages_come_from_the_page_cache():
+    index = IndexHolder(make_snapshot(["a.pdf", "b.pdf"]))
+    cache = QueryCache("test_sidor", maxsize=8)
+    calls = []
+
+    def counting_render(snapshot, query, results):
+        calls.append(results)
+        return render_page(snapshot, query, results)
+
+    for _ in range(2):
+        cursor = ResultCursor(index, index.current, "lager", [(0, 1.0), (1, 0.5)], cache_key=(index.current.version, "lager"))
+        cursor.next_page(counting_render, page_cache=cache)
+
+    assert len(calls) == 1
+    assert cursor.html == "<h4>a.pdf</h4><h4>b.pdf</h4>"
@@ -0,0 +1,30 @@
+import re
+
+from snippets import build_matcher
+
+MARK_RE = re.compile(r"<mark>(.*?)</mark>")
+
+
+def test_short_tokens_are_not_marked_when_a_longer_term_exists():
+    text = "Vi hanterar e-handel och handel med fler varor, se även e-post."
+    matcher = build_matcher("e-handel")
+
+    assert MARK_RE.findall(matcher.highlight(text)) == ["e-handel", "handel"]
+    assert MARK_RE.findall(matcher.snippet(text)) == ["e-handel", "handel"]
+
+
+def test_short_query_matches_whole_words_only():
+    matcher = build_matcher("ta")
+
+    assert MARK_RE.findall(matcher.highlight("Ta med data och ta bort.")) == ["Ta", "ta"]
+
+
+def test_corpus_snippet_uses_the_same_terms(tmp_path):
+    from corpus_store import CorpusWriter, DocumentRecord
+
+    writer = CorpusWriter(str(tmp_path), "korpus")
+    doc_id = writer.add("Vi hanterar e-handel och handel med fler varor, se även e-post.")
+    store = writer.close()
+    doc = DocumentRecord(store, doc_id, **dict.fromkeys(DocumentRecord.METADATA))
+
+    assert MARK_RE.findall(build_matcher("e-handel").snippet_for(doc)) == ["e-handel", "handel"]
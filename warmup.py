@@ -0,0 +1,70 @@
+import time
+import threading
+
+# === Uppvärmning i bakgrunden ===
+# Tunga steg (extraktion, modellimport, kodning av passager) körs i en egen
+# tråd efter att webbservern startat, så porten svarar direkt efter en
+# omstart. Stegen körs i ordning; ett steg som misslyckas loggas i statusen
+# och nästa steg körs ändå (appen får då klara sig med det som hann bli klart).
+
+PENDING = "väntar"
+RUNNING = "pågår"
+DONE = "klar"
+FAILED = "fel"
+
+
+class Warmup:
+    def __init__(self, steps):
+        """steps: [(namn, funktion utan argument), ...]"""
+        self._steps = steps
+        self._lock = threading.Lock()
+        self._status = {name: {"status": PENDING} for name, _ in steps}
+        self._started = None
+        self._thread = threading.Thread(target=self._run, name="Warmup", daemon=True)
+
+    def start(self):
+        self._started = time.monotonic()
+        self._thread.start()
+
+    def run(self, skip=()):
+        """Kör stegen synkront i anropande tråd (t.ex. i benchmarken), med samma
+        felhantering som bakgrundstråden. Steg vars namn finns i skip hoppas
+        över. Returnerar status()."""
+        self._started = time.monotonic()
+        self._run(skip)
+        return self.status()
+
+    def _set(self, name, **fields):
+        with self._lock:
+            self._status[name] = fields
+
+    def _run(self, skip=()):
+        for name, step in self._steps:
+            if name in skip:
+                continue
+            started = time.monotonic()
+            self._set(name, status=RUNNING)
+            try:
+                step()
+            except Exception as e:
+                self._set(name, status=FAILED, error=f"{type(e).__name__}: {e}", seconds=round(time.monotonic() - started, 2))
+            else:
+                self._set(name, status=DONE, seconds=round(time.monotonic() - started, 2))
+
+    def step_done(self, name):
+        with self._lock:
+            return self._status[name]["status"] == DONE
+
+    @property
+    def ready(self):
+        with self._lock:
+            return all(step["status"] == DONE for step in self._status.values())
+
+    def status(self):
+        with self._lock:
+            steps = [dict(name=name, **self._status[name]) for name, _ in self._steps]
+        return {
+            "ready": all(step["status"] == DONE for step in steps),
+            "elapsed_s": round(time.monotonic() - self._started, 2) if self._started is not None else None,
+            "steps": steps,
+        }
@@ -0,0 +1,132 @@
+import os
+from urllib.parse import quote
+
+import gradio as gr
+import uvicorn
+from fastapi import FastAPI, HTTPException, Request
+from fastapi.responses import FileResponse, HTMLResponse, JSONResponse, Response
+
+from metrics import LOCAL_ONLY_PATHS, is_local_client, render_metrics
+from query_cache import all_stats
+
+# === Webbserver runt Gradio-appen ===
+# Gradio monteras i en egen FastAPI-app så att filer kan serveras via vanliga
+# HTTP-rutter. Resultat-HTML innehåller då bara en länk i stället för hela
+# filen base64-kodad. FileResponse strömmar filen och hanterar Range-
+# förfrågningar, ETag och Last-Modified.
+
+DOWNLOAD_PREFIX = "/filer"
+DOWNLOAD_CACHE_CONTROL = "private, max-age=3600"
+
+# Bibliotek.docx: avsnittens brödtext och bilder hämtas först när de visas
+SECTION_PREFIX = "/bibliotek/sektion"
+IMAGE_PREFIX = "/bibliotek/bilder"
+STYLESHEET_URL = "/bibliotek/stil.css"
+IMAGE_CACHE_CONTROL = "public, max-age=31536000, immutable"
+
+SECTION_PAGE = """<!DOCTYPE html>
+<html lang="sv"><head><meta charset="utf-8">
+<link rel="stylesheet" href="{stylesheet_url}">
+<style>body{{font-family:sans-serif;margin:0;padding:8px;}} img{{max-width:100%;}}</style>
+</head><body>{body}</body></html>"""
+
+
+def download_url(filename):
+    return f"{DOWNLOAD_PREFIX}/{quote(filename)}"
+
+
+def image_url(name):
+    return f"{IMAGE_PREFIX}/{quote(name)}"
+
+
+def lazy_images_html(names):
+    return "".join(f"<img src='{image_url(name)}' loading='lazy' style='max-width:100%;'><br>" for name in names)
+
+
+def lazy_section_details(section_id):
+    # Iframen laddas inte förrän <details> fälls ut (loading="lazy" på dold iframe)
+    return (
+        "<details><summary>▶️ Läs mer</summary>"
+        f"<iframe src='{SECTION_PREFIX}/{quote(section_id)}' loading='lazy' "
+        "style='width:100%;height:420px;border:0;resize:vertical;'></iframe></details>"
+    )
+
+
+def add_download_route(app, resolve_path):
+    """resolve_path(filnamn) -> sökväg eller None. Bara indexerade filer kan
+    laddas ner, så godtyckliga sökvägar på servern kan aldrig nås."""
+
+    # HEAD ger storlek/ETag utan kropp (FileResponse skickar då bara headers)
+    @app.api_route(DOWNLOAD_PREFIX + "/{filename}", methods=["GET", "HEAD"])
+    def download(filename: str):
+        path = resolve_path(filename)
+        if path is None or not os.path.isfile(path):
+            raise HTTPException(status_code=404, detail="Filen finns inte")
+        return FileResponse(path, filename=filename, headers={"Cache-Control": DOWNLOAD_CACHE_CONTROL})
+
+
+def add_word_library_routes(app, render_section, image_dir, stylesheet=""):
+    """render_section(id) -> HTML för avsnittets brödtext eller None.
+    Bilderna är innehållsadresserade och kan därför cachas för alltid.
+    stylesheet: CSS som avsnittssidorna länkar till (t.ex. Pygments-klasser)."""
+
+    @app.get(STYLESHEET_URL)
+    def section_stylesheet():
+        return Response(stylesheet, media_type="text/css", headers={"Cache-Control": DOWNLOAD_CACHE_CONTROL})
+
+    @app.get(IMAGE_PREFIX + "/{name}")
+    def section_image(name: str):
+        path = os.path.join(image_dir, name)
+        if name != os.path.basename(name) or not os.path.isfile(path):
+            raise HTTPException(status_code=404, detail="Bilden finns inte")
+        return FileResponse(path, headers={"Cache-Control": IMAGE_CACHE_CONTROL})
+
+    @app.get(SECTION_PREFIX + "/{section_id}")
+    def section_body(section_id: str):
+        body = render_section(section_id)
+        if body is None:
+            raise HTTPException(status_code=404, detail="Avsnittet finns inte")
+        return HTMLResponse(SECTION_PAGE.format(stylesheet_url=STYLESHEET_URL, body=body), headers={"Cache-Control": DOWNLOAD_CACHE_CONTROL})
+
+
+def _require_local(request):
+    if request.url.path in LOCAL_ONLY_PATHS and not is_local_client(request.client.host if request.client else None):
+        raise HTTPException(status_code=403, detail="Endast lokala anrop")
+
+
+def add_stats_route(app):
+    # Träffstatistik för frågecacharna (se query_cache.py); bara från loopback
+    @app.get("/statistik/cache")
+    def cache_stats(request: Request):
+        _require_local(request)
+        return {"caches": all_stats()}
+
+
+def add_metrics_route(app):
+    # Histogram per söksteg och cachestatistik i Prometheus textformat (se metrics.py); bara från loopback
+    @app.get("/metrics")
+    def metrics(request: Request):
+        _require_local(request)
+        return Response(render_metrics(), media_type="text/plain; version=0.0.4; charset=utf-8")
+
+
+def add_health_route(app, status):
+    """status() -> dict med minst "ready". /halsa svarar alltid (processen
+    lever), /halsa/redo svarar 503 tills uppvärmningen är klar."""
+
+    @app.get("/halsa")
+    def health():
+        return status()
+
+    @app.get("/halsa/redo")
+    def readiness():
+        current = status()
+        return JSONResponse(current, status_code=200 if current["ready"] else 503)
+
+
+def launch(demo, setup_routes, server_name="127.0.0.1", server_port=7860):
+    app = FastAPI()
+    setup_routes(app)
+    # Gradio monteras sist så att de egna rutterna matchas först
+    app = gr.mount_gradio_app(app, demo, path="/")
+    uvicorn.run(app, host=server_name, port=server_port)
@@ -0,0 +1,66 @@
+import os
+import hashlib
+import tempfile
+
+from docx import Document
+
+from extraction_cache import CACHE_DIR
+
+# === Bibliotek.docx: avsnitt med rubrik + text + bilder ===
+# Bilderna skrivs en gång till en innehållsadresserad katalog på disk
+# (filnamn = SHA-1 av bildbytes) och serveras via URL, så de ligger varken i
+# minnet eller base64-kodade i varje svar. Varje avsnitt får ett id som
+# avsnittets brödtext kan hämtas med när användaren fäller ut "Läs mer".
+
+IMAGE_DIR = os.path.join(CACHE_DIR, "bilder")
+BLIP_EMBED = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}embed"
+
+
+def store_image(blob, ext, image_dir=IMAGE_DIR):
+    """Sparar bilden under sin SHA-1 och returnerar filnamnet."""
+    name = hashlib.sha1(blob).hexdigest() + ext
+    path = os.path.join(image_dir, name)
+    if not os.path.exists(path):
+        os.makedirs(image_dir, exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=image_dir, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(blob)
+        os.replace(tmp_path, path)
+    return name
+
+
+def section_id(position, heading, text):
+    return hashlib.sha1(f"{position}\0{heading}\0{text}".encode("utf-8")).hexdigest()[:16]
+
+
+def parse_word_sections(path, image_dir=IMAGE_DIR):
+    doc = Document(path)
+    sections = []
+    current_section = {"heading": "", "text": "", "images": []}
+
+    for para in doc.paragraphs:
+        if para.style.name.startswith("Heading"):
+            if current_section["heading"]:
+                sections.append(current_section)
+            current_section = {"heading": para.text, "text": "", "images": []}
+        else:
+            current_section["text"] += para.text + "\n"
+
+        for run in para.runs:
+            blips = run.element.xpath('.//a:blip')
+            if blips:
+                image_part = doc.part.related_parts[blips[0].get(BLIP_EMBED)]
+                current_section["images"].append(
+                    store_image(image_part.blob, "." + image_part.partname.ext, image_dir)
+                )
+
+    if current_section["heading"]:
+        sections.append(current_section)
+
+    for position, section in enumerate(sections):
+        section["id"] = section_id(position, section["heading"], section["text"])
+    return sections
+
+
+def find_section(sections, wanted_id):
+    return next((section for section in sections if section["id"] == wanted_id), None)